@@ -5,9 +5,41 @@ import time
 import machine
 import gc
 import os
+import struct
+import select
+import sys
+from array import array
+try:
+    import fast  # Viper hot paths, only loadable from an xtensawin build
+except:
+    fast = None
 
 # === OTA UPDATE ===
-OTA_VERSION = "4.8.3"
+OTA_VERSION = "5.0.0"
+
+# === COLD MODULES ===
+# Rarely used code lives in its own module (ota, portal, maint, fpio, backup), imported on
+# demand and dropped again so its bytecode is not resident. The modules get
+# this module passed in as `a`.
+_app = sys.modules[__name__]
+cold_sizes = {}  # Heap bytes taken by each module's import, shown in /api/mem
+
+def cold(name):
+    m = sys.modules.get(name)
+    if m:
+        return m
+    gc.collect()
+    free = gc.mem_free()
+    m = __import__(name)
+    cold_sizes[name] = free - gc.mem_free()
+    return m
+
+def drop(name):
+    try:
+        del sys.modules[name]
+    except KeyError:
+        pass
+    gc.collect()
 
 # === PINS ===
 FRONT_BTN = machine.Pin(2, machine.Pin.IN, machine.Pin.PULL_UP)
@@ -23,24 +55,49 @@ LED_CS = machine.Pin(5, machine.Pin.OUT)
 LED_NUM = 4
 LED_W = LED_NUM * 8
 
+# SPI traffic and scroll timing, see /api/mem
+led_stats = {"frames": 0, "bytes": 0, "skipped": 0,
+             "scrollFrames": 0, "colsSkipped": 0, "jitterSum": 0, "jitterMax": 0}
+
 def led_send(d):
     LED_CS.value(0)
     spi.write(d)
     LED_CS.value(1)
+    led_stats["bytes"] += len(d)
 
-def led_init():
+# Public display calls go through gfx(), which hands them to the display
+# thread in dual-core mode and runs them right away otherwise. The _-prefixed
+# bodies own the SPI bus.
+def _led_init():
     for reg, val in [(0x0C,1),(0x0B,7),(0x09,0),(0x0A,3),(0x0F,0)]:
         led_send(bytes([reg, val] * LED_NUM))
     led_clear()
 
+def led_init():
+    gfx(_led_init)
+
 def led_clear():
-    for r in range(1, 9):
-        led_send(bytes([r, 0] * LED_NUM))
+    for i in range(1, len(_frame_buf), 2):
+        _frame_buf[i] = 0
+    for row in _frame_rows:
+        led_send(row)
 
-def led_brightness(val):
+_led_shutdown = bytes([0x0C, 0] * LED_NUM)
+
+def _led_off():
+    led_clear()
+    led_send(_led_shutdown)  # Shutdown mode
+
+def led_off():
+    gfx(_led_off)
+
+def _led_brightness(val):
     v = max(0, min(15, val))
     led_send(bytes([0x0A, v] * LED_NUM))
 
+def led_brightness(val):
+    gfx(_led_brightness, val)
+
 FONT = {
  'A':[0x7E,0x11,0x11,0x7E],'B':[0x7F,0x49,0x49,0x36],'C':[0x3E,0x41,0x41,0x22],
  'D':[0x7F,0x41,0x41,0x3E],'E':[0x7F,0x49,0x49,0x41],'F':[0x7F,0x09,0x09,0x01],
@@ -61,40 +118,69 @@ FONT = {
  '.':[0x40],':':[0x24],'/':[0x60,0x18,0x06,0x01],
 }
 
+for _k in FONT:
+    FONT[_k] = bytes(FONT[_k])
+_GLYPH_UNKNOWN = b"\x55\x2A\x55\x2A"
+
 def text_to_cols(text):
-    cols = []
+    cols = bytearray()
     for ch in text:
-        glyph = FONT.get(ch) or FONT.get(ch.upper()) or [0x55,0x2A,0x55,0x2A]
-        cols.extend(glyph)
+        cols += FONT.get(ch) or FONT.get(ch.upper()) or _GLYPH_UNKNOWN
         cols.append(0)
     return cols
 
-_frame_buf = bytearray(LED_NUM * 2)
+# All 8 rows of (register, data) pairs for every module, sent row by row.
+# It doubles as the shadow of what the MAX7219s show: a frame only rewrites
+# changed data bytes and only rows with a change go out over SPI. One row
+# write carries all modules, since the daisy chain is clocked as a whole.
+_frame_buf = bytearray(8 * LED_NUM * 2)
+for _i in range(0, len(_frame_buf), 2):
+    _frame_buf[_i] = _i // (LED_NUM * 2) + 1
+_frame_rows = [memoryview(_frame_buf)[r * LED_NUM * 2:(r + 1) * LED_NUM * 2] for r in range(8)]
 wdt = None
 
 def wdt_feed():
     if wdt:
         wdt.feed()
 
-def led_display_frame(cols, offset):
+def _frame_py(cols, n, offset, out, nmod):
+    """Transpose the column window at offset into the MAX7219 row data bytes
+    of out. Returns a bitmask of the rows that changed."""
+    dirty = 0
+    i = 0
     for row in range(8):
-        d = _frame_buf
-        for m in range(LED_NUM):
-            byte = 0
-            for bit in range(8):
-                c = offset + m * 8 + bit
-                if row == 0:
-                    if 0 <= c < len(cols) and cols[c] & 0x80:
-                        byte |= 0x80 >> bit
-                elif 0 <= c < len(cols) and cols[c] & (1 << (row - 1)):
-                    byte |= 0x80 >> bit
-            d[m * 2] = row + 1
-            d[m * 2 + 1] = byte
-        led_send(d)
-
-# Non-blocking scroll state
+        mask = 0x80 if row == 0 else 1 << (row - 1)
+        c = offset
+        for m in range(nmod):
+            b = 0
+            bit = 0x80
+            while bit:
+                if 0 <= c < n and cols[c] & mask:
+                    b |= bit
+                bit >>= 1
+                c += 1
+            if out[i + 1] != b:
+                out[i + 1] = b
+                dirty |= 1 << row
+            i += 2
+    return dirty
+
+_frame = fast.frame if fast else _frame_py
+
+def led_display_frame(cols, offset):
+    dirty = _frame(cols, len(cols), offset, _frame_buf, LED_NUM)
+    led_stats["frames"] += 1
+    for r in range(8):
+        if dirty & (1 << r):
+            led_send(_frame_rows[r])
+        else:
+            led_stats["skipped"] += 1
+
+# Non-blocking scroll state. The position follows the time since
+# scroll_start (t0): after a stall the scroll skips ahead instead of
+# freezing, so speed and duration don't depend on loop load.
 scroll = {
-    "cols": None, "offset": 0, "last": 0, "speed": 35,
+    "cols": None, "offset": 0, "t0": 0, "pos": 0, "last": 0, "speed": 35,
     "count": 0, "max_count": 2, "done": True,
     "text": "", "blink": 0, "blink_last": 0,
     "static": False
@@ -103,14 +189,18 @@ scroll = {
 def scroll_start(text, count=2, speed=None):
     if speed is None:
         speed = state["display"].get("scrollSpeed", 30)
+    gfx(_scroll_start, text, count, speed)
+
+def _scroll_start(text, count, speed):
     # Cache: don't regenerate cols if same text
     if text != scroll["text"] or scroll["cols"] is None:
         scroll["text"] = text
-        cols = [0] * LED_W + text_to_cols(text) + [0] * LED_W
+        cols = bytearray(LED_W) + text_to_cols(text) + bytearray(LED_W)
         scroll["cols"] = cols
     scroll["offset"] = 0
-    scroll["last"] = time.ticks_ms()
-    scroll["speed"] = speed
+    scroll["t0"] = scroll["last"] = time.ticks_ms()
+    scroll["pos"] = 0
+    scroll["speed"] = max(1, speed)
     scroll["count"] = 0
     scroll["max_count"] = count
     scroll["done"] = False
@@ -119,126 +209,269 @@ def scroll_start(text, count=2, speed=None):
 
 def scroll_static(text):
     """Show text centered without scrolling"""
+    gfx(_scroll_static, text)
+
+def _scroll_static(text):
     cols = text_to_cols(text)
     pad = max(0, (LED_W - len(cols)) // 2)
-    buf = [0] * pad + cols + [0] * LED_W
+    buf = bytearray(pad) + cols + bytearray(LED_W)
     scroll["cols"] = buf
     scroll["offset"] = 0
     scroll["static"] = True
     scroll["done"] = True
     led_display_frame(buf, 0)
 
+def scroll_speed(speed):
+    """Change the speed of a running scroll without jumping"""
+    gfx(_scroll_speed, speed)
+
+def _scroll_speed(speed):
+    speed = max(1, speed)
+    scroll["t0"] = time.ticks_add(time.ticks_ms(), -scroll["pos"] * speed)
+    scroll["speed"] = speed
+
 def scroll_tick():
+    # In dual-core mode the display thread renders; blocking callers such
+    # as fp_enroll keep calling this and must not touch the SPI bus
+    if not gfx_on:
+        _scroll_tick()
+
+def _scroll_tick():
     if scroll["done"] or scroll["static"] or scroll["cols"] is None:
         return
     now = time.ticks_ms()
-    if time.ticks_diff(now, scroll["last"]) < scroll["speed"]:
+    spd = scroll["speed"]
+    pos = time.ticks_diff(now, scroll["t0"]) // spd
+    if pos <= scroll["pos"]:
         return
+    st = led_stats
+    st["colsSkipped"] += pos - scroll["pos"] - 1
+    if scroll["pos"]:
+        j = abs(time.ticks_diff(now, scroll["last"]) - spd)
+        st["jitterSum"] += j
+        if j > st["jitterMax"]:
+            st["jitterMax"] = j
+    st["scrollFrames"] += 1
+    scroll["pos"] = pos
     scroll["last"] = now
-    scroll["offset"] += 1
     total = len(scroll["cols"]) - LED_W
-    if scroll["offset"] >= total:
-        scroll["count"] += 1
-        if scroll["count"] >= scroll["max_count"]:
-            scroll["done"] = True
-            return
-        scroll["offset"] = 0
+    count = pos // total
+    if count >= scroll["max_count"]:
+        scroll["count"] = scroll["max_count"]
+        scroll["done"] = True
+        return
+    scroll["count"] = count
+    scroll["offset"] = pos % total
     led_display_frame(scroll["cols"], scroll["offset"])
 
 # === UART FINGERPRINT ===
 fp_uart = machine.UART(2, baudrate=57600, rx=32, tx=33, timeout=1000)
 
-def fp_send(data):
-    wdt_feed()
-    pkt = bytearray([0xEF,0x01,0xFF,0xFF,0xFF,0xFF,0x01])
+# AS608 packet: EF01 | addr FFFFFFFF | pid | len(2) | payload | sum(2)
+# The checksum covers pid..payload, so frames for fixed commands are built
+# once at import and written as-is.
+def _fp_sum_py(buf, start, end):
+    return sum(memoryview(buf)[start:end])
+
+_fp_sum = fast.csum if fast else _fp_sum_py
+
+def _fp_frame(data):
     ln = len(data) + 2
+    pkt = bytearray(b"\xEF\x01\xFF\xFF\xFF\xFF\x01")
     pkt.append(ln >> 8)
     pkt.append(ln & 0xFF)
     pkt.extend(data)
-    s = sum(pkt[6:])
-    pkt.append(s >> 8)
+    s = _fp_sum(pkt, 6, len(pkt))
+    pkt.append((s >> 8) & 0xFF)
     pkt.append(s & 0xFF)
-    fp_uart.write(pkt)
-    time.sleep_ms(500)
-    return fp_uart.read()
+    return pkt
+
+FP_GENIMG = bytes(_fp_frame(b"\x01"))
+FP_IMG2TZ1 = bytes(_fp_frame(b"\x02\x01"))
+FP_IMG2TZ2 = bytes(_fp_frame(b"\x02\x02"))
+FP_REGMODEL = bytes(_fp_frame(b"\x05"))
+FP_TEMPLATENUM = bytes(_fp_frame(b"\x1D"))
+
+# Parameterized commands: slot bytes are patched in place and the checksum
+# is the precomputed base sum plus the two slot bytes.
+_fp_store = _fp_frame(b"\x06\x01\x00\x00")
+_fp_store_sum = (_fp_store[-2] << 8) | _fp_store[-1]
+_fp_delete = _fp_frame(b"\x0C\x00\x00\x00\x01")
+_fp_delete_sum = (_fp_delete[-2] << 8) | _fp_delete[-1]
+
+# Search / HighSpeedSearch: start page at pos 11, page count at pos 13,
+# narrowed to the enrolled slots before each search.
+_fp_search = _fp_frame(b"\x04\x01\x00\x00\x00\xA3")
+_fp_hsearch = _fp_frame(b"\x1B\x01\x00\x00\x00\xA3")
+
+def _fp_patch_range(pkt, start, num):
+    pkt[11] = start >> 8
+    pkt[12] = start & 0xFF
+    pkt[13] = num >> 8
+    pkt[14] = num & 0xFF
+    s = _fp_sum(pkt, 6, len(pkt) - 2)
+    pkt[-2] = (s >> 8) & 0xFF
+    pkt[-1] = s & 0xFF
+    return pkt
+
+def _fp_patch_slot(pkt, pos, base, slot):
+    hi = (slot >> 8) & 0xFF
+    lo = slot & 0xFF
+    pkt[pos] = hi
+    pkt[pos + 1] = lo
+    s = base + hi + lo
+    pkt[-2] = (s >> 8) & 0xFF
+    pkt[-1] = s & 0xFF
+    return pkt
+
+_fp_rx = bytearray(64)
+_fp_rx_mv = memoryview(_fp_rx)
+
+def fp_recv(timeout=1000):
+    """Read one ack packet into the shared rx buffer. Returns a view or None.
+    Returns as soon as the packet is complete instead of sleeping blindly."""
+    got = 0
+    need = 9
+    t0 = time.ticks_ms()
+    while got < need:
+        k = fp_uart.any()
+        if k:
+            n = fp_uart.readinto(_fp_rx_mv[got:min(need, got + k)])
+            if n:
+                got += n
+            if need == 9 and got >= 9:
+                if _fp_rx[0] != 0xEF or _fp_rx[1] != 0x01:
+                    fp_uart.read()  # Out of sync, drop the rest
+                    return None
+                need = min(9 + ((_fp_rx[7] << 8) | _fp_rx[8]), len(_fp_rx))
+        elif time.ticks_diff(time.ticks_ms(), t0) > timeout:
+            return _fp_rx_mv[:got] if got else None
+        else:
+            time.sleep_ms(2)
+    return _fp_rx_mv[:got]
+
+def fp_cmd(frame, timeout=1000):
+    """Send a prebuilt frame and return the ack (shared buffer, read it right away)"""
+    wdt_feed()
+    if fp_uart.any():
+        fp_uart.read()
+    fp_uart.write(frame)
+    return fp_recv(timeout)
+
+def fp_send(data):
+    return fp_cmd(_fp_frame(data))
 
 def fp_code(resp):
-    return resp[9] if resp and len(resp) > 9 else -1
+    """Confirmation code of a checksum-valid ack packet, -1 otherwise"""
+    if not resp:
+        return -1
+    n = len(resp)
+    if n < 12 or resp[0] != 0xEF or resp[1] != 0x01 or resp[6] != 0x07:
+        return -1
+    end = 9 + ((resp[7] << 8) | resp[8])
+    if end > n or end < 12:
+        return -1
+    s = _fp_sum(resp, 6, end - 2)
+    if (s & 0xFFFF) != ((resp[end - 2] << 8) | resp[end - 1]):
+        return -1
+    return resp[9]
+
+def fp_u16(resp):
+    """First 16-bit parameter after the confirmation code (slot, count)"""
+    return (resp[10] << 8) | resp[11]
+
+def fp_range():
+    """(first slot, slot count) spanning all enrolled slots, None if none"""
+    sl = state["slots"]
+    lo = hi = -1
+    for i in range(len(sl)):
+        if sl[i] >= 0:
+            if lo < 0:
+                lo = i
+            hi = i
+    return None if lo < 0 else (lo, hi - lo + 1)
+
+def fp_search():
+    """Search the enrolled range for the image in char buffer 1. Returns slot or -1.
+    Search time on the AS608 grows with the range, so only enrolled slots are
+    searched; state["device"]["fpHighSpeed"] uses HighSpeedSearch (0x1B)."""
+    rng = fp_range()
+    if rng is None:
+        return -1
+    if state["device"]["fpHighSpeed"]:
+        r = fp_cmd(_fp_patch_range(_fp_hsearch, rng[0], rng[1]))
+        c = fp_code(r)
+        if c == 0:
+            return fp_u16(r)
+        if c == 0x09:  # Searched, no match
+            return -1
+        # Command not supported by this sensor: normal search below
+    r = fp_cmd(_fp_patch_range(_fp_search, rng[0], rng[1]))
+    if fp_code(r) == 0:
+        return fp_u16(r)
+    return -1
 
 def fp_scan():
     """Try to scan and identify a finger. Returns slot number or -1"""
-    r = fp_send(bytearray([0x01]))  # GenImg
+    r = fp_cmd(FP_GENIMG)
     if fp_code(r) != 0:
         return -1
-    r = fp_send(bytearray([0x02, 0x01]))  # Img2Tz
+    r = fp_cmd(FP_IMG2TZ1)
     if fp_code(r) != 0:
         return -1
-    r = fp_send(bytearray([0x04, 0x01, 0x00, 0x00, 0x00, 0xA3]))  # Search
-    if fp_code(r) == 0 and r and len(r) > 11:
-        return r[10] * 256 + r[11]
-    return -1
+    return fp_search()
 
-def fp_enroll(slot):
-    """Enroll finger at slot. Returns True/False. Blocking with LED feedback!"""
+# Enrollment waits, as long as the old 30/20 polls of ~1 s each took
+FP_FINGER_WAIT = 30000
+FP_LIFT_WAIT = 20000
+
+def _fp_wait(present, ms):
+    """Poll GenImg every ~500 ms until a finger is on (present) or off the
+    sensor, for at most ms. Keeps the scroll text moving."""
+    end = time.ticks_add(time.ticks_ms(), ms)
+    while time.ticks_diff(end, time.ticks_ms()) > 0:
+        scroll_tick()
+        if (fp_code(fp_cmd(FP_GENIMG)) == 0) == present:
+            return True
+        for _ in range(10):
+            scroll_tick()
+            time.sleep_ms(50)
+    return False
+
+def fp_enroll(slot, player):
+    """Enroll a finger of player at sensor slot. Returns True/False. Blocking with LED feedback!"""
     global fp_enrolling
     fp_enrolling = True
-    name = state["names"][slot] if slot < len(state["names"]) else "?"
+    name = state["names"][player] if player < len(state["names"]) else "?"
     fp_uart.read()  # Clear buffer
     try:
         # Step 1: Wait for first finger
         scroll_start("FINGER AUFLEGEN", count=99, speed=35)
         print("FP enroll slot", slot, "- waiting for finger 1...")
-        ok = False
-        for _ in range(30):
-            scroll_tick()
-            r = fp_send(bytearray([0x01]))
-            if fp_code(r) == 0:
-                ok = True
-                break
-            for _ in range(10):
-                scroll_tick()
-                time.sleep_ms(50)
-        if not ok:
+        if not _fp_wait(True, FP_FINGER_WAIT):
             print("FP: timeout finger 1")
             return False
-        r = fp_send(bytearray([0x02, 0x01]))
+        r = fp_cmd(FP_IMG2TZ1)
         if fp_code(r) != 0:
             print("FP: Img2Tz 1 failed")
             return False
         print("FP: finger 1 OK")
         scroll_start("OK! FINGER WEG!", count=99, speed=35)
         # Step 2: Wait for finger removal
-        for _ in range(20):
-            scroll_tick()
-            r = fp_send(bytearray([0x01]))
-            if fp_code(r) != 0:
-                break
-            for _ in range(10):
-                scroll_tick()
-                time.sleep_ms(50)
+        _fp_wait(False, FP_LIFT_WAIT)
         time.sleep_ms(500)
         # Step 3: Wait for second finger
         scroll_start("NOCHMAL AUFLEGEN", count=99, speed=35)
         print("FP: waiting for finger 2...")
-        ok = False
-        for _ in range(30):
-            scroll_tick()
-            r = fp_send(bytearray([0x01]))
-            if fp_code(r) == 0:
-                ok = True
-                break
-            for _ in range(10):
-                scroll_tick()
-                time.sleep_ms(50)
-        if not ok:
+        if not _fp_wait(True, FP_FINGER_WAIT):
             print("FP: timeout finger 2")
             return False
-        r = fp_send(bytearray([0x02, 0x02]))
+        r = fp_cmd(FP_IMG2TZ2)
         if fp_code(r) != 0:
             print("FP: Img2Tz 2 failed")
             return False
         print("FP: finger 2 OK")
-        r = fp_send(bytearray([0x05]))
+        r = fp_cmd(FP_REGMODEL)
         if fp_code(r) != 0:
             print("FP: RegModel failed")
             scroll_start("FEHLER!", count=2, speed=35)
@@ -246,7 +479,7 @@ def fp_enroll(slot):
                 scroll_tick()
                 time.sleep_ms(50)
             return False
-        r = fp_send(bytearray([0x06, 0x01, slot >> 8, slot & 0xFF]))
+        r = fp_cmd(_fp_patch_slot(_fp_store, 11, _fp_store_sum, slot))
         if fp_code(r) != 0:
             print("FP: Store failed")
             scroll_start("FEHLER!", count=2, speed=35)
@@ -266,16 +499,70 @@ def fp_enroll(slot):
 
 def fp_delete(slot):
     """Delete fingerprint at slot"""
-    r = fp_send(bytearray([0x0C, slot >> 8, slot & 0xFF, 0x00, 0x01]))
+    r = fp_cmd(_fp_patch_slot(_fp_delete, 10, _fp_delete_sum, slot))
     return fp_code(r) == 0
 
 def fp_count():
     """Get number of stored templates"""
-    r = fp_send(bytearray([0x1D]))
-    if r and len(r) > 11:
-        return r[10] * 256 + r[11]
+    r = fp_cmd(FP_TEMPLATENUM)
+    if fp_code(r) == 0:
+        return fp_u16(r)
     return 0
 
+# Sensor slot -> player map (state["slots"], -1 = free, trailing free slots
+# trimmed). A player can have several fingers, and removing or reordering
+# players only rewrites this map. state["fp"] (player has a finger) is
+# derived from it for the dashboard.
+FP_LIB_SIZE = 0xA3
+
+def fp_sync():
+    n = len(state["names"])
+    fp = [False] * n
+    for p in state["slots"]:
+        if 0 <= p < n:
+            fp[p] = True
+    state["fp"] = fp
+
+def fp_alloc():
+    """First free sensor slot, -1 if the library is full"""
+    sl = state["slots"]
+    for i in range(len(sl)):
+        if sl[i] < 0:
+            return i
+    return len(sl) if len(sl) < FP_LIB_SIZE else -1
+
+def fp_assign(slot, player):
+    sl = state["slots"]
+    while len(sl) <= slot:
+        sl.append(-1)
+    sl[slot] = player
+    while sl and sl[-1] < 0:
+        sl.pop()
+    fp_sync()
+
+def fp_player(slot):
+    sl = state["slots"]
+    return sl[slot] if 0 <= slot < len(sl) else -1
+
+def fp_fingers(player):
+    return [i for i, p in enumerate(state["slots"]) if p == player]
+
+def fp_forget(player):
+    """Delete every finger of player from the sensor and free the slots"""
+    for slot in fp_fingers(player):
+        try:
+            fp_delete(slot)
+        except:
+            pass
+        fp_assign(slot, -1)
+
+def fp_slots_from_flags(fp):
+    """Legacy layout: slot number == player index"""
+    sl = [i if fp[i] else -1 for i in range(len(fp))]
+    while sl and sl[-1] < 0:
+        sl.pop()
+    return sl
+
 # === SOUND ===
 def play_tone(freq, dur_ms, duty=50):
     AMP.value(1)
@@ -291,6 +578,9 @@ def play_tone(freq, dur_ms, duty=50):
 
 def _play(notes):
     """Play note sequence: [(freq, duration_ms), ...]"""
+    if gfx_on:
+        gfx(_snd_begin, notes)
+        return
     wdt_feed()
     d = [40, 80, 130, 200, 300][max(0, min(4, state["sound"]["volume"] - 1))]
     AMP.value(1)
@@ -340,84 +630,244 @@ def sound_highscore():
     # Kurze Fanfare
     _play([(784,150),(0,40),(784,150),(0,40),(1047,350)])
 
-# === BUTTONS ===
-btn_state = {
-    "front_down": 0, "front_clicks": 0, "front_last_up": 0, "front_was_down": False,
-    "side_down": 0, "side_clicks": 0, "side_last_up": 0, "side_was_down": False,
-    "both_start": 0, "both_triggered": False
-}
+# === DISPLAY/SOUND THREAD ===
+# Optional dual-core mode (state["device"]["dualCore"], applied at boot): a
+# second thread renders the scroll and sequences melodies, so the game and
+# network loop never waits on SPI or PWM timing. The loop only queues calls
+# through gfx(); the thread owns the SPI bus, the speaker and the scroll
+# dict (the loop only reads it once gfx_idle() says nothing is pending).
+# A new text replaces texts still queued; when the queue is full the newest
+# speed/brightness/melody call is dropped, display init/off/text never are.
+GFX_Q_MAX = 16
+gfx_on = False
+_gfx_lock = None
+_gfx_q = []
+_gfx_busy = False  # Thread has popped a command and is running it
+# Melody sequencer (thread mode): notes, index, next step time, PWM, duty
+_snd = {"notes": None, "i": 0, "t": 0, "pwm": None, "duty": 0}
+
+def gfx(fn, *args):
+    if not gfx_on:
+        fn(*args)
+        return
+    with _gfx_lock:
+        if fn is _scroll_start or fn is _scroll_static:
+            for i in range(len(_gfx_q) - 1, -1, -1):
+                if _gfx_q[i][0] is _scroll_start or _gfx_q[i][0] is _scroll_static:
+                    _gfx_q.pop(i)
+        elif len(_gfx_q) >= GFX_Q_MAX and fn in (_scroll_speed, _led_brightness, _snd_begin):
+            return
+        _gfx_q.append((fn, args))
+
+def gfx_idle():
+    """Everything queued through gfx() has run (always True without the thread)"""
+    return not (_gfx_q or _gfx_busy)
+
+def _snd_stop():
+    spk = _snd["pwm"]
+    if spk:
+        spk.duty(0)
+        spk.deinit()
+        machine.Pin(25, machine.Pin.OUT).value(0)
+    AMP.value(0)
+    _snd["pwm"] = None
+    _snd["notes"] = None
 
-def check_buttons():
-    """Non-blocking button handler. Returns action string or None"""
+def _snd_begin(notes):
+    _snd_stop()
+    _snd["duty"] = [40, 80, 130, 200, 300][max(0, min(4, state["sound"]["volume"] - 1))]
+    AMP.value(1)
+    _snd["notes"] = notes
+    _snd["i"] = -1
+    _snd["t"] = time.ticks_add(time.ticks_ms(), 80)  # Amp settle time
+
+def sound_tick():
+    notes = _snd["notes"]
+    if notes is None:
+        return
     now = time.ticks_ms()
-    f = FRONT_BTN.value() == 0
-    s = SIDE_BTN.value() == 0
-
-    # Both buttons held = WiFi reset
-    if f and s:
-        if btn_state["both_start"] == 0:
-            btn_state["both_start"] = now
-        elif not btn_state["both_triggered"] and time.ticks_diff(now, btn_state["both_start"]) > 3000:
-            btn_state["both_triggered"] = True
-            return "wifi_reset"
-        return None
-    else:
-        btn_state["both_start"] = 0
-        btn_state["both_triggered"] = False
-
-    # FRONT BUTTON
-    if f:
-        if not btn_state["front_was_down"]:
-            btn_state["front_down"] = now
-            btn_state["front_was_down"] = True
+    if time.ticks_diff(now, _snd["t"]) < 0:
+        return
+    i = _snd["i"] + 1
+    if i >= len(notes):
+        _snd_stop()
+        return
+    _snd["i"] = i
+    freq, ms = notes[i]
+    spk = _snd["pwm"]
+    if spk is None:
+        spk = _snd["pwm"] = machine.PWM(machine.Pin(25))
+    if freq == 0:
+        spk.duty(0)
     else:
-        if btn_state["front_was_down"]:
-            btn_state["front_was_down"] = False
-            held = time.ticks_diff(now, btn_state["front_down"])
-            if held > 1500:
-                btn_state["front_clicks"] = 0
-                return "front_long"
-            else:
-                btn_state["front_clicks"] += 1
-                btn_state["front_last_up"] = now
-        # Check for click timeout (300ms after last release)
-        if btn_state["front_clicks"] > 0 and time.ticks_diff(now, btn_state["front_last_up"]) > 400:
-            clicks = btn_state["front_clicks"]
-            btn_state["front_clicks"] = 0
-            if clicks == 1:
-                return "front_1"
-            elif clicks >= 2:
-                return "front_2"
-
-    # SIDE BUTTON
-    if s:
-        if not btn_state["side_was_down"]:
-            btn_state["side_down"] = now
-            btn_state["side_was_down"] = True
+        spk.freq(freq)
+        spk.duty(_snd["duty"])
+    _snd["t"] = time.ticks_add(_snd["t"], ms)
+
+def _gfx_loop():
+    global _gfx_busy
+    while True:
+        while True:
+            with _gfx_lock:
+                if not _gfx_q:
+                    _gfx_busy = False
+                    break
+                fn, args = _gfx_q.pop(0)
+                _gfx_busy = True
+            try:
+                fn(*args)
+            except Exception as e:
+                print("GFX err: " + str(e))
+        _scroll_tick()
+        sound_tick()
+        time.sleep_ms(5)
+
+def gfx_start():
+    """Start the display/sound thread. Returns False if _thread is unavailable."""
+    global gfx_on, _gfx_lock
+    try:
+        import _thread
+        _gfx_lock = _thread.allocate_lock()
+        _thread.stack_size(8192)
+        gfx_on = True
+        _thread.start_new_thread(_gfx_loop, ())
+        print("Display/Sound Thread gestartet")
+        return True
+    except Exception as e:
+        gfx_on = False
+        print("Thread err: " + str(e))
+        return False
+
+# === INPUT EVENTS ===
+# Pin IRQs only write into this preallocated ring; the main loop drains it.
+# Single producer (IRQ) / single consumer (loop), so no lock is needed:
+# the IRQ side only moves _ev_head, the loop only moves _ev_tail.
+EV_FP = 1
+EV_PIR = 2
+EV_FRONT = 3
+EV_SIDE = 4
+_EV_LEN = 32  # power of two
+_ev_src = bytearray(_EV_LEN)
+_ev_val = bytearray(_EV_LEN)
+_ev_t = array("i", [0] * _EV_LEN)
+_ev_head = 0
+_ev_tail = 0
+btn_activity = True
+
+def _ev_post(src, val):
+    global _ev_head
+    h = _ev_head
+    nxt = (h + 1) & (_EV_LEN - 1)
+    if nxt == _ev_tail:
+        return  # Full: drop, pin levels are re-read on the next event
+    _ev_src[h] = src
+    _ev_val[h] = val
+    _ev_t[h] = time.ticks_ms()
+    _ev_head = nxt
+
+def init_irqs():
+    global pir_high
+    pir_high = PIR.value() == 1
+    FP_WAKE.irq(trigger=machine.Pin.IRQ_FALLING, handler=lambda p: _ev_post(EV_FP, 0))
+    PIR.irq(trigger=machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING, handler=lambda p: _ev_post(EV_PIR, p.value()))
+    FRONT_BTN.irq(trigger=machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING, handler=lambda p: _ev_post(EV_FRONT, p.value()))
+    SIDE_BTN.irq(trigger=machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING, handler=lambda p: _ev_post(EV_SIDE, p.value()))
+
+def check_events():
+    """Drain queued pin edges into the flags the checks below react to"""
+    global _ev_tail, fp_pending, fp_touch, pir_high, motion_last, btn_activity
+    while _ev_tail != _ev_head:
+        i = _ev_tail
+        src = _ev_src[i]
+        if src == EV_FP:
+            if not fp_pending:
+                fp_touch = _ev_t[i]
+            fp_pending = True
+        elif src == EV_PIR:
+            pir_high = _ev_val[i] == 1
+            motion_last = _ev_t[i]
+        else:
+            btn_edge(btn_front if src == EV_FRONT else btn_side, _ev_val[i] == 0, _ev_t[i])
+            btn_activity = True
+        _ev_tail = (i + 1) & (_EV_LEN - 1)
+
+# === BUTTONS ===
+# Presses are classified from the IRQ edge timestamps in the event ring, so a
+# slow loop pass (fp scan, save, melody) no longer drops or merges clicks.
+BTN_DEBOUNCE = 30
+BTN_LONG = 1500
+BTN_CLICK_GAP = 400
+BTN_BOTH_HOLD = 3000
+
+def _btn(pin, name):
+    return {"pin": pin, "down": False, "t_down": 0, "edge": 0, "clicks": 0, "last_up": 0,
+            "combo": False, "a1": name + "_1", "a2": name + "_2", "along": name + "_long"}
+
+btn_front = _btn(FRONT_BTN, "front")
+btn_side = _btn(SIDE_BTN, "side")
+btn_both = {"start": 0, "triggered": False}
+_btn_actions = []
+
+def _btn_flush_clicks(b, t):
+    """Emit pending clicks once the gap after the last release has passed at t"""
+    if b["clicks"] and time.ticks_diff(t, b["last_up"]) > BTN_CLICK_GAP:
+        _btn_actions.append(b["a1"] if b["clicks"] == 1 else b["a2"])
+        b["clicks"] = 0
+
+def btn_edge(b, down, t):
+    """Apply one debounced edge at its IRQ timestamp"""
+    if down == b["down"] or time.ticks_diff(t, b["edge"]) < BTN_DEBOUNCE:
+        return
+    b["edge"] = t
+    b["down"] = down
+    if down:
+        _btn_flush_clicks(b, t)
+        b["t_down"] = t
+        other = btn_side if b is btn_front else btn_front
+        if other["down"]:
+            # Both held = WiFi reset; neither release counts as a press
+            b["combo"] = other["combo"] = True
+            btn_both["start"] = t
+        return
+    btn_both["start"] = 0
+    btn_both["triggered"] = False
+    if b["combo"]:
+        b["combo"] = False
+        b["clicks"] = 0
+        return
+    if time.ticks_diff(t, b["t_down"]) > BTN_LONG:
+        b["clicks"] = 0
+        _btn_actions.append(b["along"])
     else:
-        if btn_state["side_was_down"]:
-            btn_state["side_was_down"] = False
-            held = time.ticks_diff(now, btn_state["side_down"])
-            if held > 1500:
-                btn_state["side_clicks"] = 0
-                return "side_long"
-            else:
-                btn_state["side_clicks"] += 1
-                btn_state["side_last_up"] = now
-        if btn_state["side_clicks"] > 0 and time.ticks_diff(now, btn_state["side_last_up"]) > 400:
-            clicks = btn_state["side_clicks"]
-            btn_state["side_clicks"] = 0
-            if clicks == 1:
-                return "side_1"
-            elif clicks >= 2:
-                return "side_2"
+        b["clicks"] += 1
+        b["last_up"] = t
 
+def check_buttons():
+    """Non-blocking button handler. Returns action string or None"""
+    global btn_activity
+    if (btn_activity or btn_front["down"] or btn_side["down"]
+            or btn_front["clicks"] or btn_side["clicks"]):
+        now = time.ticks_ms()
+        for b in (btn_front, btn_side):
+            # Catch up on a level whose edge was swallowed as bounce
+            if _ev_head == _ev_tail and time.ticks_diff(now, b["edge"]) > BTN_DEBOUNCE:
+                down = b["pin"].value() == 0
+                if down != b["down"]:
+                    btn_edge(b, down, now)
+            _btn_flush_clicks(b, now)
+        st = btn_both["start"]
+        if st and not btn_both["triggered"] and time.ticks_diff(now, st) > BTN_BOTH_HOLD:
+            btn_both["triggered"] = True
+            _btn_actions.append("wifi_reset")
+        btn_activity = False
+    if _btn_actions:
+        return _btn_actions.pop(0)
     return None
 
 # === PIR / MOTION ===
 motion_last = 0
+pir_high = False  # PIR level, tracked from IRQ edges
 display_active = True
-_led_shutdown = bytes([0x0C, 0] * LED_NUM)
 
 def check_motion():
     global motion_last, display_active
@@ -429,8 +879,7 @@ def check_motion():
             led_init()
             show_current_state()
         return False
-    if PIR.value() == 1:
-        motion_last = time.ticks_ms()
+    if pir_high:
         if not display_active:
             display_active = True
             led_init()
@@ -440,62 +889,216 @@ def check_motion():
         timeout = state.get("motionTimeout", 15) * 1000
         if time.ticks_diff(time.ticks_ms(), motion_last) > timeout:
             display_active = False
-            led_clear()
-            led_send(_led_shutdown)  # Shutdown mode
+            led_off()
     return False
 
 # === FINGERPRINT CHECK ===
 FP_WAKE = machine.Pin(4, machine.Pin.IN, machine.Pin.PULL_UP)
 fp_last_check = 0
-FP_CHECK_INTERVAL = 500
+FP_CHECK_INTERVAL = 200  # Retry interval while a touched finger gives no image yet
 fp_enrolling = False
 fp_cooldown = 0
+fp_pending = False  # Set by the FP_WAKE falling-edge IRQ
+fp_touch = 0  # ticks_ms of the touch that set fp_pending
+# Recognition timing (touch -> score, search command), see /api/mem
+fp_stats = {"n": 0, "latSum": 0, "latMax": 0, "searchSum": 0}
 
 def check_fingerprint():
-    global fp_last_check, fp_cooldown
-    if not display_active or fp_enrolling:
+    global fp_last_check, fp_cooldown, fp_pending
+    if not fp_pending:
         return
-    if scroll.get("_ota"):
+    if fp_enrolling or scroll.get("_ota"):
+        fp_pending = False
         return
     now = time.ticks_ms()
-    if time.ticks_diff(now, fp_cooldown) < 3000:
-        return
-    if FP_WAKE.value() == 1:
+    if not display_active or time.ticks_diff(now, fp_cooldown) < 3000:
+        # Not scanning yet: a finger that arrived after the last scan and is
+        # still on the sensor gets scanned once we may (no new edge comes)
+        fp_pending = FP_WAKE.value() == 0 and time.ticks_diff(fp_touch, fp_cooldown) > 0
         return
     if time.ticks_diff(now, fp_last_check) < FP_CHECK_INTERVAL:
         return
     fp_last_check = now
     try:
-        fp_uart.read()
-        r = fp_send(bytearray([0x01]))
+        r = fp_cmd(FP_GENIMG)
         if fp_code(r) != 0:
+            # No image yet: keep retrying while the finger is on the sensor
+            fp_pending = FP_WAKE.value() == 0
             return
-        r = fp_send(bytearray([0x02, 0x01]))
+        fp_pending = False
+        r = fp_cmd(FP_IMG2TZ1)
         if fp_code(r) != 0:
             return
-        r = fp_send(bytearray([0x04, 0x01, 0x00, 0x00, 0x00, 0xA3]))
-        if fp_code(r) != 0 or not r or len(r) < 12:
+        t = time.ticks_ms()
+        slot = fp_search()
+        done = time.ticks_ms()
+        if slot < 0:
             txt = state["texts"].get("unknown", "UNBEKANNT!")
             scroll_start(txt, count=1)
             sound_error()
             fp_cooldown = now
             return
-        slot = r[10] * 256 + r[11]
+        lat = time.ticks_diff(done, fp_touch)
+        fp_stats["n"] += 1
+        fp_stats["latSum"] += lat
+        fp_stats["searchSum"] += time.ticks_diff(done, t)
+        if lat > fp_stats["latMax"]:
+            fp_stats["latMax"] = lat
         fp_cooldown = now
-        do_score(slot)
+        do_score(fp_player(slot))
     except Exception as e:
+        fp_pending = False
         print("FP err:", e)
 
 # === MDNS ===
-MDNS_HOST = "dishdash"
+# Every unit answers its own "dishdash-xxxx.local" (last MAC bytes), the
+# legacy "dishdash.local" alias, and advertises <host>._dishdash._tcp.local
+# so dashboards and other units can find each other. All answers are built
+# once in start_mdns; check_mdns drains the socket, matches question names
+# in place and rate-limits each multicast answer to once per second.
+# At start the names are probed (3 x 250 ms) and then announced twice; if
+# another unit already owns the alias we stop answering for it, if it owns
+# our host name we move on to -2, -3, ... Nothing is answered while probing.
+# One-shot queriers (source port != 5353, RFC 6762 6.7) get a unicast reply
+# with their query ID and question.
+MDNS_ALIAS = "dishdash"
+try:
+    _uid = machine.unique_id()
+    MDNS_HOST = MDNS_ALIAS + "-" + "%02x%02x" % (_uid[-2], _uid[-1])
+except:
+    MDNS_HOST = MDNS_ALIAS
+_mdns_base = MDNS_HOST
+_mdns_suffix = 1
+MDNS_SERVICE = "_dishdash._tcp.local"
+MDNS_GROUP = ("224.0.0.251", 5353)
+MDNS_MAX_PER_TICK = 16
 mdns_sock = None
+# Datagrams are parsed in place in one buffer. recvfrom_into also gives the
+# sender; ports without it read through readinto, and legacy queriers (see
+# _mdns_unicast) then get the multicast answer instead.
+_mdns_buf = bytearray(1024)
+_mdns_from = False
+
+_R_A = 0
+_R_ALIAS = 1
+_R_SVC = 2
+_R_SRV = 3
+_R_TXT = 4
+_R_META = 5
+_mdns_resps = [None] * 6
+_mdns_sent = [0] * 6
+_mdns_names = []  # (encoded name, ((qtype, response), ...))
+_mdns_host_n = None
+_mdns_alias_n = None
+_mdns_svc_n = None
+_mdns_ptr_query = None
+_mdns_probe_q = None
+_mdns_alias_on = True
+_mdns_phase = 0
+_mdns_next = 0
+_mdns_ip = ""
+
+def _dns_name(name):
+    b = b""
+    for part in name.split("."):
+        b += bytes([len(part)]) + part.encode()
+    return b + b"\x00"
+
+def _dns_rr(name, rtype, cls, ttl, rdata):
+    return name + struct.pack(">HHIH", rtype, cls, ttl, len(rdata)) + rdata
+
+def _dns_skip_py(d, p, n):
+    """Position after the (possibly compressed) name at p"""
+    while p < n:
+        ln = d[p]
+        if ln == 0:
+            return p + 1
+        if ln & 0xC0 == 0xC0:
+            return p + 2
+        p += ln + 1
+    return n
+
+def _dns_match_py(d, p, n, name):
+    """Does the name at p equal the encoded lowercase name? (ASCII case-insensitive)"""
+    i = 0
+    hops = 0
+    while p < n:
+        ln = d[p]
+        if ln & 0xC0 == 0xC0:
+            if p + 1 >= n or hops > 8:
+                return False
+            p = ((ln & 0x3F) << 8) | d[p + 1]
+            hops += 1
+            continue
+        if ln != name[i]:
+            return False
+        if ln == 0:
+            return True
+        if p + ln >= n:
+            return False
+        for k in range(1, ln + 1):
+            c = d[p + k]
+            if 65 <= c <= 90:
+                c += 32
+            if c != name[i + k]:
+                return False
+        i += ln + 1
+        p += ln + 1
+    return False
 
-_mdns_label = None
-_mdns_ip_bytes = None
-_mdns_resp = None
+_dns_skip = fast.dns_skip if fast else _dns_skip_py
+_dns_match = fast.dns_match if fast else _dns_match_py
+
+def _dns_label(d, p):
+    """First label of the name at p, following compression pointers"""
+    for _ in range(8):
+        ln = d[p]
+        if ln & 0xC0 == 0xC0:
+            p = ((ln & 0x3F) << 8) | d[p + 1]
+            continue
+        return bytes(d[p + 1:p + 1 + ln]).decode()
+    return ""
+
+def _mdns_build(ip_str):
+    global _mdns_host_n, _mdns_alias_n, _mdns_svc_n, _mdns_ptr_query, _mdns_probe_q, _mdns_names
+    ip = bytes(int(x) for x in ip_str.split("."))
+    host = _dns_name(MDNS_HOST + ".local")
+    alias = _dns_name(MDNS_ALIAS + ".local")
+    svc = _dns_name(MDNS_SERVICE)
+    inst = _dns_name(MDNS_HOST + "." + MDNS_SERVICE)
+    meta = _dns_name("_services._dns-sd._udp.local")
+    a_rr = _dns_rr(host, 1, 0x8001, 120, ip)
+    srv_rr = _dns_rr(inst, 33, 0x8001, 120, struct.pack(">HHH", 0, 0, 80) + host)
+    txt = b""
+    for kv in ("v=" + OTA_VERSION, "path=/api/state"):
+        txt += bytes([len(kv)]) + kv.encode()
+    txt_rr = _dns_rr(inst, 16, 0x8001, 4500, txt)
+    # Multicast responses carry ID 0, so they never need patching
+    hdr = lambda an, ar: struct.pack(">HHHHHH", 0, 0x8400, 0, an, 0, ar)
+    _mdns_resps[_R_A] = hdr(1, 0) + a_rr
+    _mdns_resps[_R_ALIAS] = hdr(1, 0) + _dns_rr(alias, 1, 0x8001, 120, ip)
+    _mdns_resps[_R_SVC] = hdr(1, 3) + _dns_rr(svc, 12, 0x0001, 4500, inst) + srv_rr + txt_rr + a_rr
+    _mdns_resps[_R_SRV] = hdr(1, 1) + srv_rr + a_rr
+    _mdns_resps[_R_TXT] = hdr(1, 0) + txt_rr
+    _mdns_resps[_R_META] = hdr(1, 0) + _dns_rr(meta, 12, 0x0001, 4500, svc)
+    _mdns_host_n = host
+    _mdns_alias_n = alias
+    _mdns_svc_n = svc
+    _mdns_names = [(host, ((1, _R_A),)), (svc, ((12, _R_SVC),)),
+                   (inst, ((33, _R_SRV), (16, _R_TXT))), (meta, ((12, _R_META),))]
+    if _mdns_alias_on:
+        _mdns_names.append((alias, ((1, _R_ALIAS),)))
+    _mdns_ptr_query = struct.pack(">HHHHHH", 0, 0, 1, 0, 0, 0) + svc + b"\x00\x0c\x00\x01"
+    _mdns_probe_q = (struct.pack(">HHHHHH", 0, 0, 2 if _mdns_alias_on else 1, 0, 0, 0)
+                     + host + b"\x00\xff\x00\x01" + (alias + b"\x00\xff\x00\x01" if _mdns_alias_on else b""))
 
 def start_mdns(ip_str):
-    global mdns_sock, _mdns_label, _mdns_ip_bytes, _mdns_resp
+    global mdns_sock, _mdns_phase, _mdns_next, _mdns_ip, _mdns_from
+    if mdns_sock:
+        try:
+            mdns_sock.close()  # Reconnect: rebind for the new address
+        except:
+            pass
     try:
         mdns_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         mdns_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -503,63 +1106,328 @@ def start_mdns(ip_str):
         mdns_sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
             bytes([224, 0, 0, 251, 0, 0, 0, 0]))
         mdns_sock.settimeout(0)
-        # Pre-build response parts
-        _mdns_label = bytes([len(MDNS_HOST)]) + MDNS_HOST.encode() + b"\x05local\x00"
-        _mdns_ip_bytes = bytes(int(x) for x in ip_str.split("."))
-        # Pre-build complete response template (just patch first 2 bytes per query)
-        _mdns_resp = bytearray(b"\x00\x00\x84\x00\x00\x00\x00\x01\x00\x00\x00\x00")
-        _mdns_resp += _mdns_label + b"\x00\x01\x80\x01\x00\x00\x00\x78\x00\x04"
-        _mdns_resp += _mdns_ip_bytes
-        print("mDNS: " + MDNS_HOST + ".local")
+        _mdns_from = hasattr(mdns_sock, "recvfrom_into")
+        _mdns_ip = ip_str
+        _mdns_build(ip_str)
+        _mdns_phase = 0
+        _mdns_next = time.ticks_ms()
+        for i in range(len(_mdns_sent)):
+            _mdns_sent[i] = time.ticks_add(_mdns_next, -1000)
+        print("mDNS: " + MDNS_HOST + ".local (" + MDNS_ALIAS + ".local)")
     except Exception as e:
         print("mDNS err: " + str(e))
         mdns_sock = None
 
+def _mdns_send(r, now):
+    if time.ticks_diff(now, _mdns_sent[r]) < 1000:
+        return  # Answered this within the last second already
+    _mdns_sent[r] = now
+    mdns_sock.sendto(_mdns_resps[r], MDNS_GROUP)
+
+def _mdns_startup(now):
+    """Probe (phases 0-2) then announce (phases 3-4), one step per call"""
+    global _mdns_phase, _mdns_next
+    if _mdns_phase < 3:
+        mdns_sock.sendto(_mdns_probe_q, MDNS_GROUP)
+        _mdns_next = time.ticks_add(now, 250)
+    else:
+        mdns_sock.sendto(_mdns_resps[_R_A], MDNS_GROUP)
+        mdns_sock.sendto(_mdns_resps[_R_SVC], MDNS_GROUP)
+        if _mdns_alias_on:
+            mdns_sock.sendto(_mdns_resps[_R_ALIAS], MDNS_GROUP)
+        _mdns_next = time.ticks_add(now, 1000)
+    _mdns_phase += 1
+
+def _mdns_conflict(alias):
+    global MDNS_HOST, _mdns_alias_on, _mdns_phase, _mdns_suffix
+    if alias:
+        print("mDNS: " + MDNS_ALIAS + ".local taken, alias off")
+        _mdns_alias_on = False
+    else:
+        _mdns_suffix += 1
+        MDNS_HOST = _mdns_base + "-" + str(_mdns_suffix)
+        print("mDNS: name taken, now " + MDNS_HOST)
+    _mdns_build(_mdns_ip)
+    _mdns_phase = 0
+
+def _mdns_unicast(r, d, q, p, addr):
+    """Legacy reply: the querier's ID, its question (if it was the first, so
+    any compression pointers in it stay valid), then our records"""
+    resp = _mdns_resps[r]
+    qd = 1 if q == 12 else 0
+    mdns_sock.sendto(d[0:2] + b"\x84\x00\x00" + bytes([qd]) + resp[6:12]
+                     + (d[q:p] if qd else b"") + resp[12:], addr)
+
+def _mdns_query(d, n, now, addr):
+    if _mdns_phase < 3:
+        return  # Still probing: the names aren't ours yet
+    legacy = addr is not None and addr[1] != 5353
+    qd = (d[4] << 8) | d[5]
+    p = 12
+    for _ in range(qd):
+        q = p
+        p = _dns_skip(d, p, n)
+        if p + 4 > n:
+            return
+        qtype = (d[p] << 8) | d[p + 1]
+        p += 4
+        for name, answers in _mdns_names:
+            if _dns_match(d, q, n, name):
+                for t, r in answers:
+                    if qtype == t or qtype == 255:
+                        if legacy:
+                            _mdns_unicast(r, d, q, p, addr)
+                        else:
+                            _mdns_send(r, now)
+                break
+
+def _mdns_response(d, n):
+    """Other responders' answers: name conflicts while probing, peers"""
+    probing = _mdns_phase < 3
+    learn = network_config.get("aggregate")
+    if not probing and not learn:
+        return
+    qd = (d[4] << 8) | d[5]
+    rr = ((d[6] << 8) | d[7]) + ((d[8] << 8) | d[9]) + ((d[10] << 8) | d[11])
+    p = 12
+    for _ in range(qd):
+        p = _dns_skip(d, p, n) + 4
+    for _ in range(rr):
+        start = p
+        p = _dns_skip(d, p, n)
+        if p + 10 > n:
+            return
+        rtype = (d[p] << 8) | d[p + 1]
+        rdlen = (d[p + 8] << 8) | d[p + 9]
+        p += 10
+        if rtype == 1 and rdlen == 4 and p + 4 <= n:
+            if probing:
+                if _dns_match(d, start, n, _mdns_host_n):
+                    _mdns_conflict(False)
+                    return
+                if _mdns_alias_on and _dns_match(d, start, n, _mdns_alias_n):
+                    _mdns_conflict(True)
+                    return
+            if learn:
+                name = _dns_label(d, start)
+                if name.startswith(MDNS_ALIAS + "-") and name != MDNS_HOST:
+                    peer_seen(name, "%d.%d.%d.%d" % (d[p], d[p + 1], d[p + 2], d[p + 3]))
+        p += rdlen
+
 def check_mdns(ip_str):
     if not mdns_sock:
         return
+    now = time.ticks_ms()
+    try:
+        if _mdns_phase < 5 and time.ticks_diff(now, _mdns_next) >= 0:
+            _mdns_startup(now)
+        d = _mdns_buf
+        for _ in range(MDNS_MAX_PER_TICK):
+            if _mdns_from:
+                n, addr = mdns_sock.recvfrom_into(d)
+            else:
+                n = mdns_sock.readinto(d)
+                addr = None
+                if n is None:
+                    break  # Nothing waiting
+            if n < 12:
+                continue
+            if d[2] & 0x80:
+                _mdns_response(d, n)
+            else:
+                _mdns_query(d, n, now, addr)
+    except OSError:
+        pass
+    except Exception as e:
+        print("mDNS err: " + str(e))
+
+# === PEERS (aggregator mode) ===
+# With network_config["aggregate"] set, the unit browses for other units
+# and keeps a cached copy of their players and scores (/api/summary). All
+# fetches run at once on non-blocking sockets driven by peers_tick() from
+# the main loop.
+PEER_TTL = 30000
+PEER_EXPIRE = 600000
+PEER_QUERY_INTERVAL = 60000
+PEER_TIMEOUT = 5000
+PEER_MAX_BODY = 16384  # Only older units still send their full state
+peers = {}
+_peer_conns = {}
+_peer_poll = select.poll()
+_peer_last_query = 0
+
+def peer_seen(host, ip):
+    p = peers.get(host)
+    if p is None:
+        p = {"ip": ip, "t": 0, "ok": False, "full": False, "names": [], "scores": [], "avatars": []}
+        peers[host] = p
+        print("Peer: " + host + " " + ip)
+    p["ip"] = ip
+    p["seen"] = time.ticks_ms()
+
+def _peer_start(host, p, now):
+    s = socket.socket()
+    s.setblocking(False)
     try:
-        data, addr = mdns_sock.recvfrom(256)
-        if _mdns_label not in data:
+        s.connect(socket.getaddrinfo(p["ip"], 80)[0][-1])
+    except OSError as e:
+        if e.args[0] not in (115, 119):  # EINPROGRESS
+            s.close()
+            p["t"] = now
+            p["ok"] = False
             return
-        # Use pre-built template, just patch transaction ID
-        _mdns_resp[0] = data[0]
-        _mdns_resp[1] = data[1]
-        mdns_sock.sendto(_mdns_resp, ("224.0.0.251", 5353))
+    _peer_conns[s] = [host, now, None]
+    _peer_poll.register(s, select.POLLOUT)
+
+def _peer_done(s, ok):
+    c = _peer_conns.pop(s)
+    try:
+        _peer_poll.unregister(s)
     except:
         pass
+    s.close()
+    p = peers.get(c[0])
+    if p is None:
+        return
+    p["t"] = time.ticks_ms()
+    p["ok"] = False
+    if ok and c[2]:
+        try:
+            i = c[2].find(b"\r\n\r\n")
+            d = json.loads(bytes(c[2][i + 4:]))
+            if "names" not in d:
+                # Unit without /api/summary (older firmware): ask for the full state next time
+                p["full"] = True
+                raise ValueError("no summary")
+            # Whatever a unit on the LAN sends, keep only short strings and ints
+            p["names"] = [str(x)[:16] for x in d["names"]][:16]
+            p["scores"] = [int(x) for x in d.get("scores", [])][:16]
+            p["avatars"] = [str(x)[:8] for x in d.get("avatars", [])][:16]
+            p["ok"] = True
+        except Exception as e:
+            print("Peer err: " + c[0] + " " + str(e))
+    c[2] = None
+
+def peers_tick():
+    global _peer_last_query
+    if not network_config.get("aggregate") or not mdns_sock:
+        return
+    now = time.ticks_ms()
+    if not _peer_last_query or time.ticks_diff(now, _peer_last_query) > PEER_QUERY_INTERVAL:
+        _peer_last_query = now
+        try:
+            mdns_sock.sendto(_mdns_ptr_query, MDNS_GROUP)
+        except:
+            pass
+        for host in list(peers):
+            if time.ticks_diff(now, peers[host]["seen"]) > PEER_EXPIRE:
+                del peers[host]
+    in_flight = [c[0] for c in _peer_conns.values()]
+    for host in peers:
+        p = peers[host]
+        if host not in in_flight and (not p["t"] or time.ticks_diff(now, p["t"]) > PEER_TTL):
+            _peer_start(host, p, now)
+    if not _peer_conns:
+        return
+    for s, ev in _peer_poll.poll(0):
+        c = _peer_conns.get(s)
+        if c is None:
+            continue
+        try:
+            if c[2] is None:
+                if ev & (select.POLLERR | select.POLLHUP):
+                    _peer_done(s, False)
+                    continue
+                s.send((b"GET /api/state" if peers[c[0]].get("full") else b"GET /api/summary") + b" HTTP/1.0\r\nHost: " + peers[c[0]]["ip"].encode() + b"\r\n\r\n")
+                c[2] = bytearray()
+                _peer_poll.modify(s, select.POLLIN)
+            else:
+                chunk = s.recv(1024)
+                if not chunk:
+                    _peer_done(s, True)
+                elif len(c[2]) + len(chunk) > PEER_MAX_BODY:
+                    _peer_done(s, False)
+                else:
+                    c[2].extend(chunk)
+        except OSError:
+            _peer_done(s, False)
+    for s in list(_peer_conns):
+        if time.ticks_diff(now, _peer_conns[s][1]) > PEER_TIMEOUT:
+            _peer_done(s, False)
+
+def peers_json():
+    """Cached peer states plus one leaderboard across all units"""
+    now = time.ticks_ms()
+    board = []
+    out = []
+    for i in range(len(state["names"])):
+        board.append({"name": state["names"][i], "score": state["scores"][i],
+                      "avatar": state["avatars"][i], "device": MDNS_HOST})
+    for host in peers:
+        p = peers[host]
+        out.append({"host": host, "ip": p["ip"], "ok": p["ok"],
+                     "age": time.ticks_diff(now, p["t"]) // 1000 if p["t"] else -1,
+                     "names": p["names"], "scores": p["scores"]})
+        for i in range(min(len(p["names"]), len(p["scores"]))):
+            board.append({"name": p["names"][i], "score": p["scores"][i],
+                          "avatar": p["avatars"][i] if i < len(p["avatars"]) else "", "device": host})
+    board.sort(key=lambda x: -x["score"])
+    return json.dumps({"self": MDNS_HOST, "peers": out, "leaderboard": board})
 
 # === DNS CAPTIVE PORTAL ===
+# Every A query is answered with the AP IP; other types (AAAA, HTTPS, ...)
+# get an empty NOERROR answer so phones stop retrying. Responses are built
+# in one reused buffer from the query header + question and a prebuilt tail.
+DNS_MAX_PER_TICK = 16
 dns_sock = None
+_dns_tail = None
+_dns_out = bytearray(512)
 
-def start_dns():
-    global dns_sock
+def start_dns(ip_str):
+    global dns_sock, _dns_tail
     try:
+        _dns_tail = b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04" + bytes(int(x) for x in ip_str.split("."))
         dns_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         dns_sock.bind(("", 53))
         dns_sock.settimeout(0)
     except:
         pass
 
-def check_dns(ip_str):
+def check_dns():
     if not dns_sock:
         return
-    try:
-        data, addr = dns_sock.recvfrom(256)
-        if len(data) < 12:
+    out = _dns_out
+    for _ in range(DNS_MAX_PER_TICK):
+        try:
+            data, addr = dns_sock.recvfrom(256)
+        except OSError:
             return
-        resp = data[0:2] + b"\x81\x80"
-        resp += data[4:6] + data[4:6] + b"\x00\x00\x00\x00"
-        pos = 12
-        while pos < len(data) and data[pos] != 0:
-            pos += data[pos] + 1
-        pos += 5
-        resp += data[12:pos]
-        resp += b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04"
-        resp += bytes(int(x) for x in ip_str.split("."))
-        dns_sock.sendto(resp, addr)
-    except:
-        pass
+        n = len(data)
+        if n < 17 or data[2] & 0x80:
+            continue
+        # End of the first question: name, then qtype + qclass
+        pos = _dns_skip(data, 12, n) + 4
+        if pos > n:
+            continue
+        qtype = (data[pos - 4] << 8) | data[pos - 3]
+        out[0:pos] = data[0:pos]
+        out[2] = 0x81
+        out[3] = 0x80
+        out[4] = 0
+        out[5] = 1
+        out[6] = 0
+        out[8] = out[9] = out[10] = out[11] = 0
+        if qtype == 1 or qtype == 255:
+            out[7] = 1
+            out[pos:pos + 16] = _dns_tail
+            m = pos + 16
+        else:
+            out[7] = 0
+            m = pos
+        try:
+            dns_sock.sendto(memoryview(out)[:m], addr)
+        except OSError:
+            pass
 
 # === STATE ===
 state = {
@@ -581,71 +1449,285 @@ state = {
     "streaks": [0, 0, 0, 0],
     "lastScorer": -1,
     "fp": [False, False, False, False],
+    "slots": [],
     "rewards": [
         {"10": "Eis essen! 🍦", "20": "Extra Fernsehen 📺", "50": "Kleines Geschenk 🎁", "100": "Großer Ausflug! 🎢"},
         {"10": "Lieblingskuchen backen 🧁", "20": "Film aussuchen 🎬", "50": "Freundin einladen 👯", "100": "Shopping Tour! 🛍"},
         {"10": "Länger wach bleiben ⏰", "20": "Lieblingsessen 🍕", "50": "Neues Spielzeug 🎮", "100": "Freizeitpark! 🎡"},
         {"10": "Extra Süßigkeiten 🍭", "20": "Mama-Papa Zeit 👨‍👩‍👧‍👦", "50": "Kleiner Wunsch 💫", "100": "Großer Wunsch! ⭐"}
     ],
-    "game": {"jumpInScore": 1, "endDate": "", "vacation": [False, False, False, False], "ended": False}
+    "game": {"jumpInScore": 1, "endDate": "", "vacation": [False, False, False, False], "ended": False},
+    "device": {"fpHighSpeed": False, "dualCore": False}
 }
 
 wifi_config = None
 network_config = {"dhcp": True, "ip": "", "gateway": "", "dns": ""}
 current_ip = ""
 ap_mode = False
-cached_nets = "[]"
-last_connect_attempt = 0
+cached_nets = None  # JSON list from portal.scan(), None = not scanned yet
 wifi_failures = 0
 
-_state_cache = None
-_state_dirty = True
-_net_cache = None
-_full_resp_cache = None
-_full_resp_bytes = None
-_full_resp_cl = None  # cached Content-Length bytes
-_full_resp_time = 0
-
-def _update_state_cache():
-    """Rebuild state response bytes if needed"""
-    global _state_cache, _state_dirty, _net_cache, _full_resp_cache, _full_resp_bytes, _full_resp_cl, _full_resp_time
-    now_ms = time.ticks_ms()
-    if _full_resp_bytes is not None and not _state_dirty and time.ticks_diff(now_ms, _full_resp_time) < 10000:
-        return
-    if _state_dirty or _state_cache is None:
-        _state_cache = json.dumps(state)
-        _net_cache = json.dumps(network_config)
-        _state_dirty = False
-    up = time.ticks_diff(now_ms, boot_time) // 1000
-    wcon = "true" if (not ap_mode and _wlan_sta and _wlan_sta.isconnected()) else "false"
-    _full_resp_cache = _state_cache[:-1] + ',"ip":"' + current_ip + '","wifi":{"ssid":"' + (wifi_config["ssid"] if wifi_config else "") + '"},"mdns":"' + MDNS_HOST + '.local","network":' + _net_cache + ',"wifi_connected":' + wcon + ',"wifi_failures":' + str(wifi_failures) + ',"boot_count":' + str(boot_count) + ',"uptime":' + str(up) + ',"mem_free":' + str(gc.mem_free()) + ',"last_reboot":"' + last_reboot_reason + '"}'
-    _full_resp_bytes = _full_resp_cache.encode("utf-8")
-    _full_resp_cl = str(len(_full_resp_bytes)).encode()
-    _full_resp_time = now_ms
-    gc.collect()
+# Boot milestones: ms since reset (ticks_ms starts at power-up), first occurrence only
+boot_marks = {}
+
+def boot_mark(name):
+    if name not in boot_marks:
+        boot_marks[name] = time.ticks_ms()
+        print("Boot " + name + ": " + str(boot_marks[name]) + " ms")
 
 # Memory diagnostics - ring buffer of last 60 readings (every 5 min = 5h history)
 _mem_log = []
 _mem_min = 999999
 
+# === STATE SNAPSHOT ===
+# state.bin (little endian):
+#   header    "<2sBBBbB"  magic "DD", version, players, turn, lastScorer, flags
+#   settings  "<BBBBBHB"  volume, brightness, scrollSpeed, scrollCount, blinkCount,
+#                         motionTimeout, jumpInScore
+#   n x "<IHB"            score, streak, bits (1 = has finger, 2 = vacation)
+#   strings               u16 length + UTF-8: names, avatars, endDate,
+#                         texts (u16 count + key/value), rewards per player (same)
+#   log                   u16 count + "<BI" (player, time) per entry
+#   stats (v2)            "<IH" week/month keys + n x _ST_FMT (see STATS)
+#   slots (v3)            u8 count + one byte per sensor slot: player, 255 = free
+#   device (v4)           u8 flags (_D_*)
+# JSON is only used for /api/state, backups and the one-time upgrade from
+# state.json. Layout changes bump STATE_VERSION and read new fields behind
+# a version check.
+STATE_VERSION = 4
+_HDR_FMT = "<2sBBBbB"
+_SET_FMT = "<BBBBBHB"
+_PL_FMT = "<IHB"
+_LOG_FMT = "<BI"
+_ST_FMT = "<HHHHHIIH"
+
+_F_RUNNING = 1
+_F_PIR = 2
+_F_ENDED = 4
+_F_SOUND = 8
+_F_ON_START = 16
+_F_ON_SCORE = 32
+_F_ON_MILESTONE = 64
+_D_FP_FAST = 1
+_D_DUAL_CORE = 2
+
+def _u8(v):
+    return max(0, min(255, int(v)))
+
+def _u16(v):
+    return max(0, min(65535, int(v)))
+
+def _u32(v):
+    return max(0, min(0xFFFFFFFF, int(v)))
+
+def _log_ok(e):
+    try:
+        return 0 <= e["p"] < 256 and 0 <= e["t"] <= 0xFFFFFFFF
+    except:
+        return False
+
+def _at(arr, i, dv):
+    """arr[i], or dv where a per-player list is short"""
+    return arr[i] if i < len(arr) else dv
+
+def _ws(f, s):
+    b = str(s).encode("utf-8")
+    f.write(struct.pack("<H", len(b)))
+    f.write(b)
+
+def _rs(f):
+    return f.read(struct.unpack("<H", f.read(2))[0]).decode("utf-8")
+
+def _wd(f, d):
+    f.write(struct.pack("<H", len(d)))
+    for k in d:
+        _ws(f, k)
+        _ws(f, d[k])
+
+def _rd(f):
+    d = {}
+    for _ in range(struct.unpack("<H", f.read(2))[0]):
+        k = _rs(f)
+        d[k] = _rs(f)
+    return d
+
+def _write_state(fn):
+    # Everything is clamped to its field and short per-player lists are
+    # padded, so one bad value can't make every later save fail
+    n = min(255, len(state["names"]))
+    snd = state["sound"]
+    dsp = state["display"]
+    g = state["game"]
+    fl = 0
+    for on, bit in ((state["running"], _F_RUNNING), (state.get("pirEnabled", True), _F_PIR),
+                    (g.get("ended", False), _F_ENDED), (snd.get("enabled", True), _F_SOUND),
+                    (snd.get("onStart", True), _F_ON_START), (snd.get("onScore", True), _F_ON_SCORE),
+                    (snd.get("onMilestone", True), _F_ON_MILESTONE)):
+        if on:
+            fl |= bit
+    vac = g["vacation"]
+    with open(fn, "wb") as f:
+        f.write(struct.pack(_HDR_FMT, b"DD", STATE_VERSION, n, _u8(state["turn"]),
+                            max(-1, min(127, state["lastScorer"])), fl))
+        f.write(struct.pack(_SET_FMT, _u8(snd.get("volume", 3)), _u8(dsp.get("brightness", 5)),
+                            _u8(dsp.get("scrollSpeed", 30)), _u8(dsp.get("scrollCount", 2)),
+                            _u8(dsp.get("blinkCount", 3)), _u16(state.get("motionTimeout", 15)),
+                            _u8(g.get("jumpInScore", 1))))
+        for i in range(n):
+            bits = (1 if _at(state["fp"], i, False) else 0) | (2 if _at(vac, i, False) else 0)
+            f.write(struct.pack(_PL_FMT, _u32(_at(state["scores"], i, 0)), _u16(_at(state["streaks"], i, 0)), bits))
+        for i in range(n):
+            _ws(f, state["names"][i])
+        for i in range(n):
+            _ws(f, _at(state["avatars"], i, ""))
+        _ws(f, g.get("endDate", ""))
+        _wd(f, state["texts"])
+        for i in range(n):
+            _wd(f, _at(state["rewards"], i, {}))
+        log = [e for e in state["log"] if _log_ok(e)]
+        f.write(struct.pack("<H", min(65535, len(log))))
+        for e in log[:65535]:
+            f.write(struct.pack(_LOG_FMT, e["p"], e["t"]))
+        f.write(struct.pack("<IH", _u32(stats["wk"]), _u16(stats["mo"])))
+        pl = stats["pl"]
+        for i in range(n):
+            s = _at(pl, i, None) or _stats_player()
+            f.write(struct.pack(_ST_FMT, _u16(s["week"]), _u16(s["month"]),
+                                _u16(s["jumps"]), _u16(s["turns"]), _u16(s["best"]),
+                                _u32(s["last"]), _u32(s["gapSum"]), _u16(s["gapN"])))
+        sl = state["slots"][:255]
+        f.write(struct.pack("<B", len(sl)))
+        f.write(bytes([p if 0 <= p < 255 else 255 for p in sl]))
+        dev = state["device"]
+        f.write(struct.pack("<B", (_D_FP_FAST if dev.get("fpHighSpeed") else 0)
+                            | (_D_DUAL_CORE if dev.get("dualCore") else 0)))
+
+def _read_state(fn):
+    with open(fn, "rb") as f:
+        magic, ver, n, turn, last, fl = struct.unpack(_HDR_FMT, f.read(7))
+        if magic != b"DD" or ver > STATE_VERSION:
+            raise ValueError("state format")
+        vol, bri, spd, cnt, blk, mto, jis = struct.unpack(_SET_FMT, f.read(8))
+        scores = []
+        streaks = []
+        fp = []
+        vac = []
+        for _ in range(n):
+            sc, st, bits = struct.unpack(_PL_FMT, f.read(7))
+            scores.append(sc)
+            streaks.append(st)
+            fp.append(bool(bits & 1))
+            vac.append(bool(bits & 2))
+        names = [_rs(f) for _ in range(n)]
+        avatars = [_rs(f) for _ in range(n)]
+        end_date = _rs(f)
+        texts = _rd(f)
+        rewards = [_rd(f) for _ in range(n)]
+        log = []
+        for _ in range(struct.unpack("<H", f.read(2))[0]):
+            p, t = struct.unpack(_LOG_FMT, f.read(5))
+            log.append({"p": p, "t": t})
+        if ver >= 2:
+            st_wk, st_mo = struct.unpack("<IH", f.read(6))
+            pl = []
+            for _ in range(n):
+                wk, mo, jumps, turns, best, seen, gap_sum, gap_n = struct.unpack(_ST_FMT, f.read(20))
+                pl.append({"week": wk, "month": mo, "jumps": jumps, "turns": turns, "best": best,
+                           "last": seen, "gapSum": gap_sum, "gapN": gap_n})
+        if ver >= 3:
+            k = f.read(1)[0]
+            raw = f.read(k)
+            if len(raw) != k:
+                raise ValueError("state truncated")
+            slots = [-1 if p == 255 else p for p in raw]
+        if ver >= 4:
+            dev = f.read(1)[0]
+    # Only a completely read file reaches the globals, so a truncated one
+    # leaves them as they were for the state.bnew or defaults fallback
+    if ver >= 2:
+        stats["wk"] = st_wk
+        stats["mo"] = st_mo
+        stats["pl"] = pl
+    if ver >= 3:
+        state["slots"] = slots
+    if ver >= 4:
+        state["device"]["fpHighSpeed"] = bool(dev & _D_FP_FAST)
+        state["device"]["dualCore"] = bool(dev & _D_DUAL_CORE)
+    state["names"] = names
+    state["avatars"] = avatars
+    state["scores"] = scores
+    state["turn"] = turn
+    state["running"] = bool(fl & _F_RUNNING)
+    state["texts"].update(texts)
+    state["display"].update({"brightness": bri, "scrollSpeed": spd, "scrollCount": cnt, "blinkCount": blk})
+    state["motionTimeout"] = mto
+    state["pirEnabled"] = bool(fl & _F_PIR)
+    state["sound"] = {"enabled": bool(fl & _F_SOUND), "volume": vol, "onStart": bool(fl & _F_ON_START),
+                      "onScore": bool(fl & _F_ON_SCORE), "onMilestone": bool(fl & _F_ON_MILESTONE)}
+    state["log"] = log
+    state["streaks"] = streaks
+    state["lastScorer"] = last
+    state["fp"] = fp
+    state["rewards"] = rewards
+    state["game"] = {"jumpInScore": jis, "endDate": end_date, "vacation": vac, "ended": bool(fl & _F_ENDED)}
+    return ver
+
+# Write-behind: save_state() only marks the state as changed and
+# persist_tick() writes it once changes have been quiet for SAVE_IDLE ms,
+# or SAVE_MAX ms after the first one at the latest, so a burst of API calls
+# costs one flash write. Queued history records (history_add) go out with
+# it, so a score API call never waits on flash. flush_state() writes right
+# away; it runs before reboots and OTA.
+SAVE_IDLE = 1000
+SAVE_MAX = 5000
+_save_first = None  # ticks_ms of the first unsaved change, None = saved
+_save_last = 0
+_save_off = False  # Set by factory reset: nothing may be written anymore
+
 def save_state():
-    global _state_dirty, _full_resp_cache, _full_resp_bytes
-    _state_dirty = True
-    _full_resp_cache = None
-    _full_resp_bytes = None
+    global _save_first, _save_last
+    _save_last = time.ticks_ms()
+    if _save_first is None:
+        _save_first = _save_last
+
+def flush_state():
+    global _save_first, _save_last
+    if _save_off:
+        return
+    history_flush()
+    if _save_first is None:
+        return
     try:
-        with open("state.tmp", "w") as f:
-            json.dump(state, f)
+        _write_state("state.bnew")
         try:
-            os.remove("state.json")
+            os.remove("state.bin")
         except:
             pass
-        os.rename("state.tmp", "state.json")
+        os.rename("state.bnew", "state.bin")
+        _save_first = None
     except Exception as e:
+        # Stay dirty and try again SAVE_MAX ms later
         print("Save err: " + str(e))
+        _save_first = time.ticks_ms()
+        _save_last = time.ticks_add(_save_first, SAVE_MAX - SAVE_IDLE)
+
+def persist_tick():
+    if _save_first is None:
+        return
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _save_last) >= SAVE_IDLE or time.ticks_diff(now, _save_first) >= SAVE_MAX:
+        flush_state()
+
+def save_discard():
+    """Drop unsaved changes and block further writes until the reboot"""
+    global _save_first, _save_off
+    _save_first = None
+    _save_off = True
+    del _hist_pending[:]
 
 def reboot(reason="manual"):
-    """Save reason and reboot"""
+    """Save state and reason, then reboot"""
+    flush_state()
     try:
         with open("reboot.txt", "w") as f:
             f.write(reason)
@@ -653,58 +1735,346 @@ def reboot(reason="manual"):
         pass
     machine.reset()
 
+def _migrate_json(data):
+    """One-time upgrade of a legacy state.json (fills keys added over time)"""
+    state.update(data)
+    n = len(state["names"])
+    if "sound" not in state:
+        state["sound"] = {"enabled": True, "volume": 3, "onStart": True, "onScore": True, "onMilestone": True}
+    if "log" not in state:
+        state["log"] = []
+    if "streaks" not in state:
+        state["streaks"] = [0] * n
+    if "lastScorer" not in state:
+        state["lastScorer"] = -1
+    if "fp" not in state:
+        state["fp"] = [False] * n
+    if "rewards" not in state:
+        state["rewards"] = [{"10": "Belohnung 🎁", "20": "Größere Belohnung 🌟", "50": "Super Belohnung! 🎉", "100": "Mega Belohnung!! 🏆"} for _ in range(n)]
+    for arr, dv in [("scores", 0), ("streaks", 0)]:
+        while len(state[arr]) < n:
+            state[arr].append(dv)
+        state[arr] = state[arr][:n]
+    while len(state["avatars"]) < n:
+        state["avatars"].append("\U0001f534")
+    state["avatars"] = state["avatars"][:n]
+    while len(state["fp"]) < n:
+        state["fp"].append(False)
+    state["fp"] = state["fp"][:n]
+    while len(state["rewards"]) < n:
+        state["rewards"].append({"10": "Belohnung 🎁", "20": "Größere Belohnung 🌟", "50": "Super Belohnung! 🎉", "100": "Mega Belohnung!! 🏆"})
+    state["rewards"] = state["rewards"][:n]
+    # Game settings
+    if "game" not in state:
+        state["game"] = {"jumpInScore": 1, "endDate": "", "vacation": [False] * n, "ended": False}
+    g = state["game"]
+    if "vacation" not in g:
+        g["vacation"] = [False] * n
+    while len(g["vacation"]) < n:
+        g["vacation"].append(False)
+    g["vacation"] = g["vacation"][:n]
+    if "jumpInScore" not in g:
+        g["jumpInScore"] = 1
+    if "endDate" not in g:
+        g["endDate"] = ""
+    if "ended" not in g:
+        g["ended"] = False
+
+def _migrate_state(ver):
+    """Fill in what older snapshot versions did not store"""
+    if ver < 2:
+        stats_rebuild()
+    if ver < 3:
+        state["slots"] = fp_slots_from_flags(state["fp"])
+
 def load_state():
-    global state
+    for fn in ["state.bin", "state.bnew"]:
+        try:
+            ver = _read_state(fn)
+            stats_resize(len(state["names"]))
+            if ver < STATE_VERSION:
+                _migrate_state(ver)
+                save_state()
+            print("State: " + fn)
+            return
+        except:
+            continue
     for fn in ["state.json", "state.tmp"]:
         try:
             with open(fn, "r") as f:
                 data = json.load(f)
-            state.update(data)
-            n = len(state["names"])
-            if "sound" not in state:
-                state["sound"] = {"enabled": True, "volume": 3, "onStart": True, "onScore": True, "onMilestone": True}
-            if "log" not in state:
-                state["log"] = []
-            if "streaks" not in state:
-                state["streaks"] = [0] * n
-            if "lastScorer" not in state:
-                state["lastScorer"] = -1
-            if "fp" not in state:
-                state["fp"] = [False] * n
-            if "rewards" not in state:
-                state["rewards"] = [{"10": "Belohnung 🎁", "20": "Größere Belohnung 🌟", "50": "Super Belohnung! 🎉", "100": "Mega Belohnung!! 🏆"} for _ in range(n)]
-            for arr, dv in [("scores", 0), ("streaks", 0)]:
-                while len(state[arr]) < n:
-                    state[arr].append(dv)
-                state[arr] = state[arr][:n]
-            while len(state["fp"]) < n:
-                state["fp"].append(False)
-            state["fp"] = state["fp"][:n]
-            while len(state["rewards"]) < n:
-                state["rewards"].append({"10": "Belohnung 🎁", "20": "Größere Belohnung 🌟", "50": "Super Belohnung! 🎉", "100": "Mega Belohnung!! 🏆"})
-            state["rewards"] = state["rewards"][:n]
-            # Game settings
-            if "game" not in state:
-                state["game"] = {"jumpInScore": 1, "endDate": "", "vacation": [False] * n, "ended": False}
-            g = state["game"]
-            if "vacation" not in g:
-                g["vacation"] = [False] * n
-            while len(g["vacation"]) < n:
-                g["vacation"].append(False)
-            g["vacation"] = g["vacation"][:n]
-            if "jumpInScore" not in g:
-                g["jumpInScore"] = 1
-            if "endDate" not in g:
-                g["endDate"] = ""
-            if "ended" not in g:
-                g["ended"] = False
-            print("State: " + fn)
+            _migrate_json(data)
+            stats_resize(len(state["names"]))
+            _migrate_state(0)
+            save_state()
+            for old in ["state.json", "state.tmp"]:
+                try:
+                    os.remove(old)
+                except:
+                    pass
+            print("State: " + fn + " -> state.bin")
             return
         except:
             continue
     print("Kein State -> Defaults")
+    stats_resize(len(state["names"]))
     save_state()
 
+# === HISTORY ===
+# history.bin is a ring of fixed records holding every score and reset:
+#   header "<2sBBHH"  magic "DH", version, reserved, head (next slot), count
+#   record "<IBB"     time, player (HIST_RESET for a score reset),
+#                     points | HIST_JUMP if scored out of turn
+# state["log"] only keeps the last LOG_RECENT entries for the dashboard.
+HIST_FN = "history.bin"
+HIST_CAP = 4096
+HIST_RESET = 255
+HIST_JUMP = 0x80
+LOG_RECENT = 15
+_HHDR_FMT = "<2sBBHH"
+_HREC_FMT = "<IBB"
+_HHDR_SZ = 8
+_HREC_SZ = 6
+_hist_pending = []
+_hist_buf = bytearray(_HREC_SZ * 64)
+
+def _hist_header(f):
+    f.seek(0)
+    b = f.read(_HHDR_SZ)
+    if len(b) < _HHDR_SZ:
+        raise ValueError("history format")
+    magic, ver, _, head, count = struct.unpack(_HHDR_FMT, b)
+    if magic != b"DH" or head >= HIST_CAP or count > HIST_CAP:
+        raise ValueError("history format")
+    return head, count
+
+def history_add(p, t, pts, jump=False):
+    """Queue one record; history_flush() writes it with the next state save"""
+    _hist_pending.append((t, p, min(127, pts) | (HIST_JUMP if jump else 0)))
+
+def history_flush():
+    """Append queued records with one file open and one header update"""
+    if not _hist_pending:
+        return
+    try:
+        f = None
+        try:
+            f = open(HIST_FN, "r+b")
+            head, count = _hist_header(f)
+        except (OSError, ValueError):
+            # Missing or corrupt header: start over
+            if f:
+                f.close()
+            f = open(HIST_FN, "w+b")
+            head = count = 0
+        with f:
+            for t, p, pts in _hist_pending:
+                f.seek(_HHDR_SZ + head * _HREC_SZ)
+                f.write(struct.pack(_HREC_FMT, t, p, pts))
+                head = (head + 1) % HIST_CAP
+                if count < HIST_CAP:
+                    count += 1
+            f.seek(0)
+            f.write(struct.pack(_HHDR_FMT, b"DH", 1, 0, head, count))
+    except Exception as e:
+        print("History err: " + str(e))
+    del _hist_pending[:]
+
+def history_remap(new):
+    """Rewrite player indices after players moved or left: a record of p
+    becomes new[p]; -1, or p past the list, drops it. Resets stay."""
+    history_flush()
+    try:
+        src = open(HIST_FN, "rb")
+    except OSError:
+        return
+    try:
+        with src:
+            head, count = _hist_header(src)
+            start = head if count == HIST_CAP else 0
+            kept = 0
+            mv = memoryview(_hist_buf)
+            with open("history.bnew", "wb") as dst:
+                dst.write(struct.pack(_HHDR_FMT, b"DH", 1, 0, 0, 0))
+                i = 0
+                while i < count:
+                    pos = (start + i) % HIST_CAP
+                    k = min(count - i, HIST_CAP - pos, len(_hist_buf) // _HREC_SZ)
+                    src.seek(_HHDR_SZ + pos * _HREC_SZ)
+                    src.readinto(mv[:k * _HREC_SZ])
+                    out = 0  # Compacts in place: out never passes j
+                    for j in range(k):
+                        t, p, pts = struct.unpack_from(_HREC_FMT, _hist_buf, j * _HREC_SZ)
+                        if p != HIST_RESET:
+                            p = new[p] if p < len(new) else -1
+                            if p < 0:
+                                continue
+                        struct.pack_into(_HREC_FMT, _hist_buf, out * _HREC_SZ, t, p, pts)
+                        out += 1
+                    dst.write(mv[:out * _HREC_SZ])
+                    kept += out
+                    i += k
+                    wdt_feed()
+                dst.seek(0)
+                dst.write(struct.pack(_HHDR_FMT, b"DH", 1, 0, kept % HIST_CAP, kept))
+        os.remove(HIST_FN)
+        os.rename("history.bnew", HIST_FN)
+    except Exception as e:
+        print("History remap err: " + str(e))
+
+def history_init():
+    """Seed a missing history file from the recent log (first boot after upgrade)"""
+    try:
+        os.stat(HIST_FN)
+    except OSError:
+        for e in state["log"]:
+            history_add(e["p"], e["t"], 1)
+        if _hist_pending:
+            history_flush()
+
+def send_history(cl, path):
+    """Stream matching records as JSON without building the whole list"""
+    q = parse_query(path)
+    try:
+        t_from = int(q.get("from", 0))
+        t_to = int(q.get("to", 0)) or 0xFFFFFFFF
+        player = int(q.get("player", -1))
+        offset = max(0, int(q.get("offset", 0)))
+        limit = max(1, min(500, int(q.get("limit", 100))))
+    except ValueError:
+        send_resp(cl, '{"error":"bad query"}', ct="application/json")
+        return
+    # Records still waiting for the next save belong in the answer
+    history_flush()
+    cl.send(_HDR_JSON_STREAM)
+    cl.send('{"records":[')
+    matched = 0
+    sent = 0
+    more = False
+    try:
+        with open(HIST_FN, "rb") as f:
+            head, count = _hist_header(f)
+            start = head if count == HIST_CAP else 0
+            # Oldest first: [start, end of ring) then [0, head)
+            ranges = ((start, count), (0, 0)) if start == 0 else ((start, HIST_CAP), (0, head))
+            mv = memoryview(_hist_buf)
+            for lo, hi in ranges:
+                i = lo
+                while i < hi and not more:
+                    k = min(hi - i, len(_hist_buf) // _HREC_SZ)
+                    f.seek(_HHDR_SZ + i * _HREC_SZ)
+                    f.readinto(mv[:k * _HREC_SZ])
+                    out = ""
+                    for j in range(k):
+                        t, p, pts = struct.unpack_from(_HREC_FMT, _hist_buf, j * _HREC_SZ)
+                        if t < t_from or t > t_to or (player >= 0 and p != player):
+                            continue
+                        matched += 1
+                        if matched <= offset:
+                            continue
+                        if sent == limit:
+                            more = True
+                            break
+                        out += ("," if sent else "") + "[" + str(t) + "," + str(p) + "," + str(pts & 0x7F) + (",1]" if pts & HIST_JUMP else ",0]")
+                        sent += 1
+                    if out:
+                        cl.send(out)
+                    i += k
+                    wdt_feed()
+    except OSError:
+        pass
+    cl.send('],"offset":' + str(offset) + ',"next":' + (str(offset + sent) if more else "null") + '}')
+
+# === STATS ===
+# Aggregates updated in O(1) per score, so /api/stats and the highscore
+# screen never rescan history. Week key = day number of that week's Monday,
+# month key = year * 12 + month - 1. stats["rank"] holds player indices
+# sorted by score and is kept sorted as points come in.
+stats = {"wk": 0, "mo": 0, "pl": [], "rank": []}
+
+def _stats_player():
+    return {"week": 0, "month": 0, "jumps": 0, "turns": 0, "best": 0, "last": 0, "gapSum": 0, "gapN": 0}
+
+def stats_rank():
+    """Full re-sort, only needed after resets, restores and player changes"""
+    sc = state["scores"]
+    r = list(range(len(sc)))
+    r.sort(key=lambda i: -sc[i])
+    stats["rank"] = r
+
+def stats_resize(n):
+    pl = stats["pl"]
+    while len(pl) < n:
+        pl.append(_stats_player())
+    del pl[n:]
+    stats_rank()
+
+def stats_score(p, t, pts, turn):
+    lt = time.localtime(t)
+    wk = t // 86400 - lt[6]
+    mo = lt[0] * 12 + lt[1] - 1
+    pl = stats["pl"]
+    if wk > stats["wk"]:
+        stats["wk"] = wk
+        for s in pl:
+            s["week"] = 0
+    if mo > stats["mo"]:
+        stats["mo"] = mo
+        for s in pl:
+            s["month"] = 0
+    s = pl[p]
+    if wk == stats["wk"]:
+        s["week"] += pts
+    if mo == stats["mo"]:
+        s["month"] += pts
+    if turn:
+        s["turns"] += 1
+        if s["last"] and t > s["last"]:
+            s["gapSum"] += t - s["last"]
+            s["gapN"] += 1
+        if t > s["last"]:
+            s["last"] = t
+    else:
+        s["jumps"] += 1
+    if p < len(state["streaks"]) and state["streaks"][p] > s["best"]:
+        s["best"] = state["streaks"][p]
+    # Only the scorer moved, and only upwards
+    r = stats["rank"]
+    sc = state["scores"]
+    i = r.index(p)
+    while i > 0 and sc[r[i - 1]] < sc[p]:
+        r[i] = r[i - 1]
+        i -= 1
+    r[i] = p
+
+def stats_rebuild():
+    """Replay history.bin into fresh aggregates (one-time upgrade)"""
+    n = len(state["names"])
+    stats["wk"] = stats["mo"] = 0
+    stats["pl"] = []
+    stats_resize(n)
+    try:
+        with open(HIST_FN, "rb") as f:
+            head, count = _hist_header(f)
+            start = head if count == HIST_CAP else 0
+            for i in range(count):
+                if i == 0 or (start + i) % HIST_CAP == 0:
+                    f.seek(_HHDR_SZ + ((start + i) % HIST_CAP) * _HREC_SZ)
+                t, p, pts = struct.unpack(_HREC_FMT, f.read(_HREC_SZ))
+                if p < n:
+                    stats_score(p, t, pts & 0x7F, not pts & HIST_JUMP)
+    except Exception as e:
+        print("Stats rebuild: " + str(e))
+    stats_rank()
+
+def stats_json():
+    pl = []
+    for s in stats["pl"]:
+        pl.append({"week": s["week"], "month": s["month"], "jumps": s["jumps"], "turns": s["turns"],
+                   "bestStreak": s["best"], "avgGap": s["gapSum"] // s["gapN"] if s["gapN"] else 0})
+    return json.dumps({"weekStart": stats["wk"] * 86400, "month": stats["mo"] % 12 + 1,
+                       "ranking": stats["rank"], "players": pl})
+
 def load_wifi():
     global wifi_config
     try:
@@ -720,6 +2090,9 @@ def save_wifi(ssid, password):
     with open("wifi.json", "w") as f:
         json.dump(wifi_config, f)
 
+# Device switches that older versions kept in network.json
+NET_MOVED = ("fpHighSpeed", "dualCore")
+
 def load_network():
     global network_config
     try:
@@ -727,19 +2100,15 @@ def load_network():
             network_config.update(json.load(f))
     except:
         pass
+    for k in NET_MOVED:
+        if k in network_config:
+            state["device"][k] = bool(network_config.pop(k))
+            save_state()
 
 def save_network():
     with open("network.json", "w") as f:
         json.dump(network_config, f)
 
-def factory_reset():
-    for fn in ["state.json", "state.tmp", "wifi.json", "network.json", "boots.txt", "reboot.txt"]:
-        try:
-            os.remove(fn)
-            print("Removed: " + fn)
-        except:
-            pass
-
 # === GAME LOGIC ===
 def next_active_turn(from_idx):
     """Find next non-vacation player starting after from_idx"""
@@ -842,18 +2211,21 @@ def show_current_state():
             txt += "  NOCH " + str(d) + (" TAG!" if d == 1 else " TAGE!")
         scroll_start(txt, count=cnt, speed=spd)
 
-def do_score(player_idx):
-    """Score a point for player. Called by fingerprint or API."""
+def do_score(player_idx, t=None, commit=True):
+    """Score a point for player. Called by fingerprint or API.
+    commit=False only updates the game state (no save, sound or LED)."""
     n = len(state["names"])
     if player_idx < 0 or player_idx >= n:
-        txt = state["texts"].get("unknown", "UNBEKANNT!")
-        scroll_start(txt, count=1)
-        sound_error()
+        if commit:
+            txt = state["texts"].get("unknown", "UNBEKANNT!")
+            scroll_start(txt, count=1)
+            sound_error()
         return None
 
     # Game ended?
     if state["game"].get("ended", False):
-        scroll_start("SPIEL BEENDET!", count=1)
+        if commit:
+            scroll_start("SPIEL BEENDET!", count=1)
         return None
 
     current_turn = state["turn"]
@@ -886,15 +2258,27 @@ def do_score(player_idx):
     state["lastScorer"] = player_idx
 
     # Log
-    state["log"].append({"p": player_idx, "t": int(time.time())})
-    if len(state["log"]) > 30:
-        state["log"] = state["log"][-30:]
+    if t is None:
+        t = int(time.time())
+    pts = 1 if is_turn_player else state["game"].get("jumpInScore", 1)
+    state["log"].append({"p": player_idx, "t": t})
+    if len(state["log"]) > LOG_RECENT:
+        state["log"] = state["log"][-LOG_RECENT:]
+    history_add(player_idx, t, pts, not is_turn_player)
+    stats_score(player_idx, t, pts, is_turn_player)
+
+    score = state["scores"][player_idx]
+    reward = None
+    if str(score) in state["rewards"][player_idx]:
+        reward = {"player": player_idx, "score": score, "text": state["rewards"][player_idx][str(score)]}
+
+    if not commit:
+        return reward
 
     save_state()
 
     # LED + Sound
     name = state["names"][player_idx]
-    pts = 1 if is_turn_player else state["game"].get("jumpInScore", 1)
 
     if is_turn_player:
         txt = state["texts"].get("point", "{NAME} +1 PUNKT!").replace("{NAME}", name)
@@ -909,11 +2293,6 @@ def do_score(player_idx):
     if d > 0:
         txt += "  NOCH " + str(d) + (" TAG" if d == 1 else " TAGE")
 
-    score = state["scores"][player_idx]
-    reward = None
-    if str(score) in state["rewards"][player_idx]:
-        reward = {"player": player_idx, "score": score, "text": state["rewards"][player_idx][str(score)]}
-
     if reward:
         sound_milestone()
     else:
@@ -922,22 +2301,92 @@ def do_score(player_idx):
     scroll_start(txt, count=1)
     return reward
 
-def do_start():
+def do_start(commit=True):
     """Dishwasher started - show next player's turn"""
     state["running"] = False
+    if not commit:
+        return
     save_state()
     sound_start()
     show_current_state()
 
-def do_skip():
+def do_skip(commit=True):
     """Skip current player"""
     turn = state["turn"]
     name = state["names"][turn] if turn < len(state["names"]) else "?"
     state["turn"] = next_active_turn(turn)
+    if not commit:
+        return
     save_state()
     txt = state["texts"].get("skipped", "{NAME} ÜBERSPRUNGEN!").replace("{NAME}", name)
     scroll_start(txt, count=1)
 
+# Client timestamps are in the port's epoch (1970, or 2000 on ports where
+# time.gmtime(0) says so). Once the clock is set (past 2020) a time must lie
+# between 2020 and a day ahead of it; before that nothing meaningful can be
+# compared, so only the u32 range of a history record is checked and the
+# device's own unset-clock times stay valid too.
+EV_T_MIN = 1577836800 - (946684800 if time.gmtime(0)[0] == 2000 else 0)
+EV_AHEAD = 86400
+
+def _events_check(events):
+    """Raise ValueError if any event in the batch is malformed"""
+    if not isinstance(events, list):
+        raise ValueError("events")
+    n = len(state["names"])
+    now = int(time.time())
+    if now >= EV_T_MIN:
+        t_min, t_max = EV_T_MIN, min(now + EV_AHEAD, 0xFFFFFFFF)
+    else:
+        t_min, t_max = 0, 0xFFFFFFFF
+    for ev in events:
+        if not isinstance(ev, dict):
+            raise ValueError("event")
+        if ev.get("a") == "score":
+            idx = ev.get("player")
+            if not isinstance(idx, int) or isinstance(idx, bool) or not 0 <= idx < n:
+                raise ValueError("player")
+        t = ev.get("t")
+        if t is not None and (not isinstance(t, int) or isinstance(t, bool) or not t_min <= t <= t_max):
+            raise ValueError("t")
+
+def do_events(events):
+    """Apply a list of {"a": "score"|"start"|"skip", "player", "t"} actions in
+    order with one save, one sound and one display refresh at the end.
+    The whole batch is checked first (ValueError, nothing applied).
+    Returns (applied, rewards)."""
+    _events_check(events)
+    applied = 0
+    rewards = []
+    scored = started = False
+    for ev in events:
+        a = ev.get("a")
+        if a == "score":
+            if state["game"].get("ended", False):
+                continue
+            reward = do_score(ev["player"], t=ev.get("t"), commit=False)
+            if reward:
+                rewards.append(reward)
+            scored = True
+        elif a == "start":
+            do_start(commit=False)
+            started = True
+        elif a == "skip":
+            do_skip(commit=False)
+        else:
+            continue
+        applied += 1
+    if applied:
+        save_state()
+        if rewards:
+            sound_milestone()
+        elif scored:
+            sound_score()
+        elif started:
+            sound_start()
+        show_current_state()
+    return applied, rewards
+
 def do_reset():
     """Reset all scores"""
     n = len(state["names"])
@@ -948,21 +2397,254 @@ def do_reset():
     state["streaks"] = [0] * n
     state["lastScorer"] = -1
     state["game"]["ended"] = False
+    stats_rank()
     save_state()
+    history_add(HIST_RESET, int(time.time()), 0)
     scroll_start(state["texts"].get("reset", "RESET!"), count=1)
 
+def players_reorder(order):
+    """Rebuild every per-player list from order (old indices in their new
+    order). Players left out are removed with their fingers and history; the
+    slot map follows, so nobody else has to re-enroll."""
+    n = len(state["names"])
+    new = [-1] * n
+    for i, j in enumerate(order):
+        new[j] = i
+    for p in range(n):
+        if new[p] < 0:
+            fp_forget(p)
+    for k in ("names", "avatars", "scores", "streaks", "rewards"):
+        arr = state[k]
+        state[k] = [arr[j] for j in order]
+    g = state["game"]
+    vac = g["vacation"]
+    g["vacation"] = [vac[j] if j < len(vac) else False for j in order]
+    pl = stats["pl"]
+    stats["pl"] = [pl[j] if j < len(pl) else _stats_player() for j in order]
+    sl = state["slots"]
+    for i in range(len(sl)):
+        if sl[i] >= 0:
+            sl[i] = new[sl[i]] if sl[i] < n else -1
+    while sl and sl[-1] < 0:
+        sl.pop()
+    fp_sync()
+    state["log"] = [{"p": new[e["p"]], "t": e["t"]} for e in state["log"] if e["p"] < n and new[e["p"]] >= 0]
+    # A removed player's turn passes to whoever came after them
+    t = state["turn"]
+    while t < n and new[t] < 0:
+        t += 1
+    state["turn"] = new[t] if t < n else 0
+    last = state["lastScorer"]
+    state["lastScorer"] = new[last] if 0 <= last < n else -1
+    history_remap(new)
+    stats_rank()
+
 def show_highscores():
     """Show highscores on LED"""
     sound_highscore()
-    pairs = [(state["names"][i], state["scores"][i]) for i in range(len(state["names"]))]
-    pairs.sort(key=lambda x: x[1], reverse=True)
-    txt = "  ".join([p[0] + ":" + str(p[1]) for p in pairs])
+    txt = "  ".join([state["names"][i] + ":" + str(state["scores"][i]) for i in stats["rank"]])
     scroll_start(txt, count=1)
 
 def show_ip():
     """Show IP on LED"""
     scroll_start(current_ip, count=1)
 
+# === SETTINGS ===
+# All settings changes go through config_update(): every section is checked
+# before anything is touched, then applied in one go with a single save and
+# at most one display refresh. PATCH /api/config takes any subset of
+# CONFIG_SECTIONS, the old PUT endpoints pass their one section.
+CONFIG_SECTIONS = ("names", "texts", "display", "sound", "rewards", "game", "device")
+MAX_PLAYERS = 8
+
+# Integer settings and the ranges they are clamped to; the snapshot stores
+# them as u8 (motionTimeout as u16)
+CFG_INTS = {"brightness": (0, 15), "scrollSpeed": (1, 255), "scrollCount": (1, 255),
+            "blinkCount": (0, 255), "motionTimeout": (0, 65535),
+            "volume": (1, 5), "jumpInScore": (1, 10)}
+CFG_BOOLS = ("pirEnabled", "enabled", "onStart", "onScore", "onMilestone", "fpHighSpeed", "dualCore")
+# What each section takes. Other keys are dropped, not refused: the
+# dashboard posts whole state objects back, read-only fields included.
+CFG_KEYS = {"display": ("brightness", "scrollSpeed", "scrollCount", "blinkCount", "motionTimeout", "pirEnabled"),
+            "sound": ("enabled", "volume", "onStart", "onScore", "onMilestone"),
+            "game": ("jumpInScore", "endDate", "vacation"),
+            "device": ("fpHighSpeed", "dualCore")}
+
+def _cfg_dict(d):
+    if not isinstance(d, dict):
+        raise TypeError
+    return d
+
+def _cfg_str(v):
+    if not isinstance(v, str):
+        raise TypeError
+    return v
+
+def _cfg_bool(v):
+    if not isinstance(v, (bool, int)):
+        raise TypeError
+    return bool(v)
+
+def _cfg_val(k, v):
+    """One number or switch, converted"""
+    if k in CFG_INTS:
+        lo, hi = CFG_INTS[k]
+        return max(lo, min(hi, int(v)))
+    return _cfg_bool(v)
+
+def _cfg_strs(d):
+    """A {str: str} map such as texts or one player's rewards"""
+    out = {}
+    for k in _cfg_dict(d):
+        out[_cfg_str(k)] = _cfg_str(d[k])
+    return out
+
+def _cfg_norm(cfg):
+    """Checked and converted copy of a settings update. Raises ValueError
+    naming the first bad section; state is untouched."""
+    if not isinstance(cfg, dict):
+        raise ValueError("config")
+    for k in cfg:
+        if k not in CONFIG_SECTIONS:
+            raise ValueError(k)
+    out = {}
+    n = len(state["names"])
+    for k in CONFIG_SECTIONS:
+        if k not in cfg:
+            continue
+        try:
+            d = cfg[k]
+            if k == "names":
+                _cfg_dict(d)
+                names = d.get("names", state["names"])
+                avatars = d.get("avatars", state["avatars"])
+                if not isinstance(names, list) or not 1 <= len(names) <= MAX_PLAYERS or not isinstance(avatars, list):
+                    raise ValueError
+                n = len(names)
+                out[k] = {"names": [_cfg_str(nm).upper()[:10] for nm in names],
+                          "avatars": [_cfg_str(av) for av in avatars]}
+            elif k == "texts":
+                out[k] = _cfg_strs(d)
+            elif k == "rewards":
+                if isinstance(d, dict):
+                    p = d.get("player", 0)
+                    if not isinstance(p, int) or isinstance(p, bool) or not 0 <= p < n:
+                        raise ValueError
+                    out[k] = {p: _cfg_strs(d.get("rewards", {}))}
+                else:
+                    if not isinstance(d, list) or len(d) > n:
+                        raise ValueError
+                    out[k] = dict((i, _cfg_strs(rw)) for i, rw in enumerate(d))
+            elif k == "game":
+                g = {}
+                for gk in _cfg_dict(d):
+                    if gk not in CFG_KEYS[k]:
+                        continue
+                    if gk == "endDate":
+                        g[gk] = _cfg_str(d[gk])
+                    elif gk == "vacation":
+                        vac = d[gk]
+                        if not isinstance(vac, list):
+                            raise TypeError
+                        g[gk] = [_cfg_bool(v) for v in vac]
+                    else:
+                        g[gk] = _cfg_val(gk, d[gk])
+                out[k] = g
+            else:
+                # display, sound and device: numbers and switches only
+                out[k] = dict((sk, _cfg_val(sk, d[sk])) for sk in _cfg_dict(d) if sk in CFG_KEYS[k])
+        except (TypeError, ValueError, AttributeError, KeyError):
+            raise ValueError(k)
+    return out
+
+def _cfg_names(data):
+    names = data["names"]
+    avatars = data["avatars"]
+    old_n = len(state["names"])
+    n = len(names)
+    # If players were cut off the end, delete their fingers and history
+    for p in range(n, old_n):
+        fp_forget(p)
+    if n < old_n:
+        history_remap(list(range(n)))
+    state["names"] = names
+    while len(avatars) < n:
+        avatars.append("\U0001f534")
+    state["avatars"] = avatars[:n]
+    for arr, dv in [("scores", 0), ("streaks", 0)]:
+        while len(state[arr]) < n:
+            state[arr].append(dv)
+        state[arr] = state[arr][:n]
+    fp_sync()
+    while len(state["rewards"]) < n:
+        state["rewards"].append({"10": "Belohnung 🎁", "20": "Größere Belohnung 🌟", "50": "Super Belohnung! 🎉", "100": "Mega Belohnung!! 🏆"})
+    state["rewards"] = state["rewards"][:n]
+    # Resize vacation array
+    g = state["game"]
+    while len(g["vacation"]) < n:
+        g["vacation"].append(False)
+    g["vacation"] = g["vacation"][:n]
+    if state["turn"] >= n:
+        state["turn"] = 0
+    stats_resize(n)
+
+def _cfg_display(data):
+    data = dict(data)
+    if "motionTimeout" in data:
+        state["motionTimeout"] = data.pop("motionTimeout")
+    if "pirEnabled" in data:
+        state["pirEnabled"] = data.pop("pirEnabled")
+    state["display"].update(data)
+    led_brightness(state["display"].get("brightness", 5))
+    scroll_speed(state["display"].get("scrollSpeed", 30))
+
+def _cfg_game(data):
+    g = state["game"]
+    if "jumpInScore" in data:
+        g["jumpInScore"] = data["jumpInScore"]
+    if "endDate" in data:
+        g["endDate"] = data["endDate"]
+        g["ended"] = False
+        invalidate_days_cache()
+    if "vacation" in data:
+        vac = data["vacation"]
+        n = len(state["names"])
+        g["vacation"] = [(vac[i] if i < len(vac) else False) for i in range(n)]
+        # If current turn player is now on vacation, advance
+        if g["vacation"][state["turn"]]:
+            state["turn"] = next_active_turn(state["turn"])
+
+def config_update(cfg):
+    """Check and apply settings sections. Returns None or the name of the
+    section that failed, in which case nothing was changed."""
+    try:
+        cfg = _cfg_norm(cfg)
+    except ValueError as e:
+        return str(e)
+    # Names first: the other sections are sized against the new player list
+    if "names" in cfg:
+        _cfg_names(cfg["names"])
+    if "texts" in cfg:
+        state["texts"].update(cfg["texts"])
+    if "display" in cfg:
+        _cfg_display(cfg["display"])
+    if "sound" in cfg:
+        state["sound"].update(cfg["sound"])
+    if "device" in cfg:
+        state["device"].update(cfg["device"])
+    if "rewards" in cfg:
+        for i, rw in cfg["rewards"].items():
+            state["rewards"][i] = rw
+    if "game" in cfg:
+        _cfg_game(cfg["game"])
+    save_state()
+    if "names" in cfg or "texts" in cfg or "game" in cfg:
+        show_current_state()
+    return None
+
+def _cfg_result(err):
+    return '{"ok":true}' if err is None else '{"ok":false,"error":' + json.dumps(err) + '}'
+
 # === BUTTON ACTIONS ===
 def handle_button(action):
     if scroll.get("_ota"):
@@ -995,113 +2677,131 @@ def handle_button(action):
         reboot("wifi_reset")
 
 # === WLAN ===
-def do_scan():
-    global cached_nets
-    gc.collect()
-    print("Scanne WLANs... Free:", gc.mem_free())
-    sta = network.WLAN(network.STA_IF)
-    sta.active(True)
-    time.sleep(3)
-    try:
-        raw = sta.scan()
-        seen = set()
-        result = []
-        for n in raw:
-            try:
-                ssid = n[0].decode("utf-8").strip()
-            except:
-                continue
-            if not ssid or ssid in seen:
-                continue
-            seen.add(ssid)
-            rssi = n[3]
-            if rssi > -50: sig = "████"
-            elif rssi > -65: sig = "███░"
-            elif rssi > -75: sig = "██░░"
-            else: sig = "█░░░"
-            result.append({"s": ssid, "r": sig})
-        result.sort(key=lambda x: x["s"].lower())
-        cached_nets = json.dumps(result)
-        print("  " + str(len(result)) + " Netzwerke")
-    except Exception as e:
-        print("  Scan err: " + str(e))
-        cached_nets = "[]"
-    sta.active(False)
-    time.sleep(1)
-    gc.collect()
-
-def connect_wifi():
-    global current_ip, wifi_failures
-    ap = network.WLAN(network.AP_IF)
-    ap.active(False)
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
+# WiFi runs as a state machine polled from the main loop, so a router
+# blip never freezes buttons or scoring:
+#   IDLE -> CONNECTING -> CONNECTED -> (link lost) BACKOFF -> CONNECTING ...
+# A boot that never got a link opens the setup AP after WIFI_BOOT_TRIES, but
+# keeps trying the saved network every WIFI_AP_RETRY ms (AP + STA at once)
+# and closes the AP once that works, e.g. when the router came up late.
+WIFI_IDLE = 0
+WIFI_CONNECTING = 1
+WIFI_CONNECTED = 2
+WIFI_BACKOFF = 3
+WIFI_CONNECT_TIMEOUT = 20000
+WIFI_BOOT_TRIES = 3  # Failed attempts before a never-connected boot falls back to AP mode
+WIFI_AP_RETRY = 60000
+wifi = {"st": WIFI_IDLE, "t": 0, "ever": False}
+_wlan_sta = None
+_WIFI_FAIL = tuple(getattr(network, n) for n in ("STAT_WRONG_PASSWORD", "STAT_NO_AP_FOUND", "STAT_CONNECT_FAIL")
+                   if hasattr(network, n))
+
+def wifi_begin():
+    """Start a connection attempt and return immediately"""
+    global _wlan_sta
+    if not ap_mode:
+        network.WLAN(network.AP_IF).active(False)
+    _wlan_sta = network.WLAN(network.STA_IF)
+    _wlan_sta.active(True)
     try:
         network.hostname(MDNS_HOST)
     except:
         pass
     print("Verbinde: " + wifi_config["ssid"])
-    wlan.connect(wifi_config["ssid"], wifi_config["password"])
-    for i in range(20):
-        if wlan.isconnected():
-            break
-        for _ in range(20):
-            scroll_tick()
-            wdt_feed()
-            time.sleep_ms(50)
-        print(".", end="")
-    print()
-    if wlan.isconnected():
-        if not network_config["dhcp"]:
-            try:
-                wlan.ifconfig((network_config["ip"], "255.255.255.0", network_config["gateway"], network_config["dns"]))
-                current_ip = network_config["ip"]
-                print("Static IP: " + current_ip)
-            except Exception as e:
-                print("Static IP failed: " + str(e))
-                current_ip = wlan.ifconfig()[0]
-        else:
-            current_ip = wlan.ifconfig()[0]
-            print("DHCP IP: " + current_ip)
+    try:
+        _wlan_sta.connect(wifi_config["ssid"], wifi_config["password"])
+    except OSError as e:
+        print("Connect err: " + str(e))
+    wifi["st"] = WIFI_CONNECTING
+    wifi["t"] = time.ticks_ms()
+
+def _wifi_up():
+    global current_ip, wifi_failures
+    wlan = _wlan_sta
+    if not network_config["dhcp"]:
         try:
-            with open("lastip.txt", "w") as f:
-                f.write(current_ip)
-        except:
-            pass
-        start_mdns(current_ip)
-        wifi_failures = 0
-        return True
+            wlan.ifconfig((network_config["ip"], "255.255.255.0", network_config["gateway"], network_config["dns"]))
+            current_ip = network_config["ip"]
+            print("Static IP: " + current_ip)
+        except Exception as e:
+            print("Static IP failed: " + str(e))
+            current_ip = wlan.ifconfig()[0]
     else:
-        print("VERBINDUNG FEHLGESCHLAGEN")
-        wifi_failures += 1
-        wlan.active(False)
-        return False
-
-_wlan_sta = None
-
-def check_wifi_reconnect():
-    global last_connect_attempt, wifi_failures, _wlan_sta
-    if ap_mode:
+        current_ip = wlan.ifconfig()[0]
+        print("DHCP IP: " + current_ip)
+    try:
+        with open("lastip.txt", "w") as f:
+            f.write(current_ip)
+    except:
+        pass
+    start_mdns(current_ip)
+    boot_mark("mdns")
+    wifi_failures = 0
+    wifi["st"] = WIFI_CONNECTED
+    if not wifi["ever"]:
+        wifi["ever"] = True
+        boot_mark("wifi")
+
+def wifi_tick():
+    """Advance the WiFi state machine; never blocks"""
+    global wifi_failures
+    if wifi_config is None:
         return
-    if _wlan_sta is None:
-        _wlan_sta = network.WLAN(network.STA_IF)
-    if not _wlan_sta.isconnected():
-        now = time.ticks_ms()
-        delay = min(30000 + (wifi_failures * 10000), 120000)
-        if time.ticks_diff(now, last_connect_attempt) > delay:
-            last_connect_attempt = now
+    st = wifi["st"]
+    now = time.ticks_ms()
+    if ap_mode and st != WIFI_CONNECTING:
+        if time.ticks_diff(now, wifi["t"]) > WIFI_AP_RETRY:
+            print("WiFi retry (Setup-AP aktiv)")
+            wifi_begin()
+        return
+    if st == WIFI_CONNECTING:
+        if _wlan_sta.isconnected():
+            if ap_mode:
+                stop_ap()
+            _wifi_up()
+        elif _wlan_sta.status() in _WIFI_FAIL or time.ticks_diff(now, wifi["t"]) > WIFI_CONNECT_TIMEOUT:
+            print("VERBINDUNG FEHLGESCHLAGEN")
+            wifi_failures += 1
+            try:
+                _wlan_sta.disconnect()
+            except:
+                pass
+            _wlan_sta.active(False)
+            wifi["st"] = WIFI_IDLE if ap_mode else WIFI_BACKOFF
+            wifi["t"] = now
+    elif st == WIFI_CONNECTED:
+        if not _wlan_sta.isconnected():
+            print("WiFi verloren")
+            wifi["st"] = WIFI_BACKOFF
+            wifi["t"] = now
+    elif st == WIFI_BACKOFF:
+        if _wlan_sta.isconnected():
+            # The driver reconnected on its own: keep that link
+            print("WiFi wieder da")
+            _wifi_up()
+            return
+        if wifi["ever"]:
+            delay = min(30000 + (wifi_failures * 10000), 120000)
+        elif wifi_failures >= WIFI_BOOT_TRIES:
+            print("-> AP Modus (Fallback)")
+            wifi["st"] = WIFI_IDLE
+            wifi["t"] = now
+            start_ap(boot=False)
+            scroll_static("SETUP")
+            return
+        else:
+            delay = 2000
+        if time.ticks_diff(now, wifi["t"]) > delay:
             print("WiFi reconnect attempt " + str(wifi_failures + 1))
-            connect_wifi()
+            wifi_begin()
 
 def quick_connect(ssid, pwd):
     print("Quick-connect: " + ssid)
     sta = network.WLAN(network.STA_IF)
     sta.active(True)
-    time.sleep(1)
     try:
         sta.connect(ssid, pwd)
         ip = ""
-        for i in range(12):
+        for i in range(120):
             if sta.isconnected():
                 if not network_config["dhcp"]:
                     try:
@@ -1113,9 +2813,10 @@ def quick_connect(ssid, pwd):
                     ip = sta.ifconfig()[0]
                 print("Quick-connect OK: " + ip)
                 break
-            time.sleep(1)
-            print(".", end="")
-        print()
+            if sta.status() in _WIFI_FAIL:
+                break
+            wdt_feed()
+            time.sleep_ms(100)
         try:
             sta.disconnect()
         except:
@@ -1130,99 +2831,62 @@ def quick_connect(ssid, pwd):
             pass
         return ""
 
-def start_ap():
+def start_ap(boot=True):
+    """Open the setup AP. At boot (before the main loop) the networks are
+    scanned first; the fallback from wifi_tick() must not block, so it skips
+    the settle pauses and leaves the scan to the first setup page request."""
     global current_ip, ap_mode
     ap_mode = True
-    gc.collect()
-    do_scan()
+    if boot:
+        cold("portal").scan(_app)
+        drop("portal")
     sta = network.WLAN(network.STA_IF)
     sta.active(False)
-    time.sleep(1)
+    if boot:
+        time.sleep(1)
     ap = network.WLAN(network.AP_IF)
     ap.active(True)
-    time.sleep(1)
+    if boot:
+        time.sleep(1)
     ap.config(essid="DISH-DASH-Setup")
-    time.sleep(2)
+    if boot:
+        time.sleep(2)
     current_ip = ap.ifconfig()[0]
-    start_dns()
+    start_dns(current_ip)
     print("=== SETUP MODUS ===")
     print("WLAN: DISH-DASH-Setup")
     print("URL:  http://" + current_ip)
 
-# === SETUP HTML ===
-def get_setup_html():
-    nl = ""
-    try:
-        nets = json.loads(cached_nets)
-        for i, n in enumerate(nets):
-            s = n["s"].replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;")
-            nl += '<div class="n" data-s="' + s + '"><span>' + s + '</span><span class="r">' + n["r"] + '</span></div>'
-    except:
-        pass
-    if not nl:
-        nl = '<div style="text-align:center;padding:12px;color:#666;font-size:12px">Keine Netzwerke gefunden.<br>Nutze die manuelle Eingabe.</div>'
-    h = '<!DOCTYPE html><html><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1"><title>Dish Dash Setup</title><style>'
-    h += '*{box-sizing:border-box;margin:0;padding:0}body{background:#0a0a0f;color:#e8e8ef;font-family:system-ui,sans-serif;min-height:100vh;display:flex;align-items:center;justify-content:center;padding:20px}'
-    h += '.c{background:rgba(255,255,255,.06);border:1px solid rgba(255,255,255,.1);border-radius:16px;padding:28px;max-width:380px;width:100%}'
-    h += 'h1{font-size:22px;text-align:center}.sub{font-size:10px;color:#555;text-align:center;letter-spacing:3px;margin:4px 0 24px}'
-    h += 'label{font-size:12px;color:#888;display:block;margin:14px 0 6px}'
-    h += 'input{width:100%;padding:11px;background:rgba(255,255,255,.04);border:1px solid rgba(255,255,255,.08);border-radius:8px;color:#fff;font-size:14px;outline:none}input:focus{border-color:#00d68f}'
-    h += '.btn{width:100%;padding:13px;border:none;border-radius:10px;color:#fff;font-size:14px;font-weight:600;cursor:pointer;margin-top:18px;background:linear-gradient(135deg,#00d68f,#00b377)}'
-    h += '.st{text-align:center;margin-top:14px;font-size:13px;color:#888;line-height:1.7}'
-    h += '.nl{max-height:200px;overflow-y:auto;margin-top:8px}'
-    h += '.n{padding:10px 12px;background:rgba(255,255,255,.03);border:1px solid rgba(255,255,255,.05);border-radius:8px;margin-bottom:4px;cursor:pointer;font-size:13px;display:flex;justify-content:space-between}'
-    h += '.n:hover,.n.a{background:rgba(0,214,143,.12);border-color:rgba(0,214,143,.25)}.n .r{font-size:11px;color:#555;font-family:monospace}'
-    h += '.e{color:#ff4d6a}.ic{text-align:center;font-size:36px;margin-bottom:12px}'
-    h += '.or{font-size:12px;color:#555;text-align:center;margin:12px 0;display:flex;align-items:center;gap:8px}.or::before,.or::after{content:"";flex:1;height:1px;background:rgba(255,255,255,.06)}'
-    h += '.ok{background:rgba(0,214,143,.08);border:1px solid rgba(0,214,143,.2);border-radius:12px;padding:24px;text-align:center;margin-top:16px}'
-    h += '.lnk{display:block;padding:14px;background:linear-gradient(135deg,#00d68f,#00b377);color:#fff;font-size:15px;font-weight:700;border-radius:10px;text-decoration:none;margin:12px 0}'
-    h += '.ip{font-size:22px;font-weight:700;color:#00d68f;margin:8px 0;font-family:monospace}'
-    h += '.wait{padding:12px;background:rgba(255,255,255,.04);border-radius:8px;margin:16px 0}.wait .num{font-size:24px;font-weight:700;color:#ffb740}'
-    h += '.dim{font-size:11px;color:#666;line-height:1.8}'
-    h += '.spinner{display:inline-block;width:14px;height:14px;border:2px solid rgba(255,255,255,.1);border-top:2px solid #00d68f;border-radius:50%;animation:spin 1s linear infinite}@keyframes spin{to{transform:rotate(360deg)}}'
-    h += '</style></head><body><div class="c"><div class="ic">&#127869;</div><h1>Dish Dash</h1><div class="sub">WLAN EINRICHTEN</div><div id="f">'
-    h += '<label>&#128246; Netzwerk waehlen</label><div id="nl" class="nl">'
-    h += nl
-    h += '</div><div class="or">oder manuell eingeben</div>'
-    h += '<input id="ms" placeholder="SSID manuell eingeben" style="font-size:12px">'
-    h += '<label>&#128274; Passwort</label>'
-    h += '<div style="position:relative"><input id="pw" type="password" placeholder="WLAN Passwort"><span id="eye" style="position:absolute;right:10px;top:50%;transform:translateY(-50%);cursor:pointer">&#128065;</span></div>'
-    h += '<button class="btn" id="goBtn">Verbinden</button></div><div id="st" class="st"></div></div>'
-    h += '<script>'
-    h += 'var pick="";'
-    h += 'document.getElementById("nl").addEventListener("click",function(e){var n=e.target.closest(".n");if(!n)return;pick=n.getAttribute("data-s");document.getElementById("ms").value="";var a=document.querySelectorAll(".n");for(var i=0;i<a.length;i++)a[i].className="n";n.className="n a";});'
-    h += 'document.getElementById("eye").addEventListener("click",function(){var i=document.getElementById("pw");i.type=i.type==="password"?"text":"password";});'
-    h += 'document.getElementById("goBtn").addEventListener("click",function(){'
-    h += 'var ssid=pick||document.getElementById("ms").value.trim();'
-    h += 'if(!ssid){document.getElementById("st").innerHTML="<span class=e>Bitte Netzwerk waehlen</span>";return;}'
-    h += 'document.getElementById("st").innerHTML="<div class=spinner></div> Verbinde... (ca. 15 Sek.)";'
-    h += 'document.getElementById("f").style.opacity="0.3";document.getElementById("f").style.pointerEvents="none";'
-    h += 'var x=new XMLHttpRequest();x.timeout=25000;x.open("POST","/api/setup");x.setRequestHeader("Content-Type","application/json");'
-    h += 'x.onload=function(){try{var d=JSON.parse(x.responseText)}catch(e){showDone(ssid,"");return}showDone(ssid,d.ip||"")};'
-    h += 'x.onerror=function(){showDone(ssid,"")};x.ontimeout=function(){showDone(ssid,"")};'
-    h += 'x.send(JSON.stringify({ssid:ssid,password:document.getElementById("pw").value}));});'
-    h += 'function showDone(ssid,ip){document.getElementById("f").style.display="none";'
-    h += 'var h="<div class=ok><div style=font-size:28px;margin-bottom:8px>&#9989;</div>";'
-    h += 'if(ip){h+="<div style=font-weight:600>Verbunden!</div>";h+="<div class=ip>"+ip+"</div>";'
-    h += 'h+="<div class=wait><div style=font-size:12px;color:#888;margin-bottom:6px>Verbinde dein Handy jetzt mit <b style=color:#fff>"+ssid+"</b></div>";'
-    h += 'h+="<div class=num id=ct>10</div><div style=font-size:11px;color:#555>Sekunden</div></div>";'
-    h += 'h+="<div id=lw style=display:none><a class=lnk href=http://"+ip+">&#127869; Dashboard oeffnen</a>";'
-    h += 'h+="<div class=dim>Speichere http://"+ip+" als Lesezeichen!</div></div>";'
-    h += 'var sec=10;var ci=setInterval(function(){sec--;document.getElementById(\"ct\").textContent=sec;if(sec<=0){clearInterval(ci);document.querySelector(\".wait\").style.display=\"none\";document.getElementById(\"lw\").style.display=\"block\";}},1000);'
-    h += '}else{h+="<div style=font-weight:600>Gespeichert!</div>";'
-    h += 'h+="<div style=margin:10px_0;font-size:13px;color:#888>Geraet startet neu...<br>Verbinde dein Handy mit <b style=color:#fff>"+ssid+"</b></div>";'
-    h += 'h+="<div class=wait><div class=num id=ct>15</div><div style=font-size:11px;color:#555>Sekunden</div></div>";'
-    h += 'h+="<div id=lw style=display:none><a class=lnk href=http://dishdash.local>&#127869; dishdash.local</a>";'
-    h += 'h+="<div class=dim>Falls nicht erreichbar: IP im Router nachschauen</div></div>";'
-    h += 'var sec=15;var ci=setInterval(function(){sec--;document.getElementById(\"ct\").textContent=sec;if(sec<=0){clearInterval(ci);document.querySelector(\".wait\").style.display=\"none\";document.getElementById(\"lw\").style.display=\"block\";}},1000);'
-    h += '}h+="</div>";document.getElementById("st").innerHTML=h;}'
-    h += '</script></body></html>'
-    return h
+def stop_ap():
+    """Leave the fallback setup AP once the saved network is reachable"""
+    global ap_mode, dns_sock
+    ap_mode = False
+    if dns_sock:
+        try:
+            dns_sock.close()
+        except:
+            pass
+        dns_sock = None
+    network.WLAN(network.AP_IF).active(False)
+    print("Setup-AP aus")
+    show_current_state()
 
 # === HTTP ===
 _HDR_JSON = b"HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=utf-8\r\nAccess-Control-Allow-Origin: *\r\nContent-Length: "
 _HDR_HTML = b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\nAccess-Control-Allow-Origin: *\r\nContent-Length: "
 _HDR_END = b"\r\nConnection: close\r\n\r\n"
+_HDR_JSON_STREAM = b"HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=utf-8\r\nAccess-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n"
+
+def parse_query(path):
+    """Query string of a request path as a dict (no percent-decoding)"""
+    q = {}
+    i = path.find("?")
+    if i >= 0:
+        for kv in path[i + 1:].split("&"):
+            k, _, v = kv.partition("=")
+            if k:
+                q[k] = v
+    return q
 
 def send_resp(cl, body, ct="text/html"):
     if isinstance(body, str):
@@ -1239,9 +2903,124 @@ def send_resp(cl, body, ct="text/html"):
         cl.send(mv[i:i+512])
     del mv
 
+def _content_length(hdr):
+    """Content-Length from a request header block, 0 if missing"""
+    i = hdr.lower().find("content-length:")
+    if i < 0:
+        return 0
+    j = hdr.find("\r\n", i)
+    if j < 0:
+        j = len(hdr)
+    try:
+        return int(hdr[i + 15:j].strip())
+    except:
+        return 0
+
 def send_redirect(cl, url):
     cl.send("HTTP/1.1 302 Found\r\nLocation: " + url + "\r\nConnection: close\r\n\r\n")
 
+# === JSON STREAM ===
+# Responses that contain the state are written piece by piece through one
+# fixed buffer instead of building the document with json.dumps() first,
+# so the heap needed stays the same however many players, rewards, texts
+# and log entries there are. json.dumps() is only used for single scalars
+# and strings (escaping).
+_jbuf = bytearray(512)
+_jn = 0
+_jcl = None
+
+def json_begin(cl):
+    global _jcl, _jn
+    _jcl = cl
+    _jn = 0
+    cl.send(_HDR_JSON_STREAM)
+
+def json_raw(s):
+    """Append ready-made JSON text to the stream"""
+    global _jn
+    if isinstance(s, str):
+        s = s.encode("utf-8")
+    n = len(s)
+    if _jn + n > len(_jbuf):
+        json_flush()
+        if n > len(_jbuf):
+            _jcl.send(s)
+            return
+    _jbuf[_jn:_jn + n] = s
+    _jn += n
+
+def json_flush():
+    global _jn
+    if _jn:
+        _jcl.send(memoryview(_jbuf)[:_jn])
+        _jn = 0
+
+def json_key(k, first=False):
+    """Write an object key, preceded by a comma unless it is the first"""
+    if not first:
+        json_raw(",")
+    json_raw(json.dumps(k))
+    json_raw(":")
+
+def json_value(v):
+    """Write v (dict, list, tuple or scalar) without serializing it as a whole"""
+    if isinstance(v, dict):
+        json_raw("{")
+        first = True
+        for k in v:
+            json_key(str(k), first)
+            json_value(v[k])
+            first = False
+        json_raw("}")
+    elif isinstance(v, (list, tuple)):
+        json_raw("[")
+        for i in range(len(v)):
+            if i:
+                json_raw(",")
+            json_value(v[i])
+        json_raw("]")
+    else:
+        json_raw(json.dumps(v))
+
+def json_end():
+    global _jcl
+    json_flush()
+    _jcl = None
+
+def send_state(cl):
+    """GET /api/state: the state plus network and diagnostic fields"""
+    json_begin(cl)
+    json_raw("{")
+    first = True
+    for k in state:
+        json_key(k, first)
+        json_value(state[k])
+        first = False
+    json_key("ip")
+    json_value(current_ip)
+    json_key("wifi")
+    json_value({"ssid": wifi_config["ssid"] if wifi_config else ""})
+    json_key("mdns")
+    json_value(MDNS_HOST + ".local")
+    json_key("network")
+    json_value(network_config)
+    json_key("wifi_connected")
+    json_value(not ap_mode and bool(_wlan_sta) and _wlan_sta.isconnected())
+    json_key("wifi_failures")
+    json_value(wifi_failures)
+    json_key("boot_count")
+    json_value(boot_count)
+    json_key("uptime")
+    json_value(time.ticks_diff(time.ticks_ms(), boot_time) // 1000)
+    json_key("mem_free")
+    json_value(gc.mem_free())
+    json_key("last_reboot")
+    json_value(last_reboot_reason)
+    json_key("boot")
+    json_value(boot_marks)
+    json_raw("}")
+    json_end()
+
 _send_buf = bytearray(2048)
 
 def send_file(cl, fn, ct="text/html", cache=0, gz=False):
@@ -1271,23 +3050,14 @@ def send_cors(cl):
 def handle_api(method, path, body):
     # === SETUP ===
     if path == "/api/setup" and method == "POST":
-        data = json.loads(body)
-        ssid = data["ssid"]
-        pwd = data.get("password", "")
-        save_wifi(ssid, pwd)
-        ip = quick_connect(ssid, pwd)
-        if ip:
-            def _rb(t):
-                reboot("wifi_setup")
-            machine.Timer(0).init(period=3000, mode=machine.Timer.ONE_SHOT, callback=_rb)
-            return '{"ok":true,"ip":"' + ip + '"}'
-        else:
-            def _rb(t):
-                reboot("wifi_setup")
-            machine.Timer(0).init(period=1500, mode=machine.Timer.ONE_SHOT, callback=_rb)
-            return '{"ok":true,"ip":""}'
+        r = cold("portal").setup(_app, body)
+        drop("portal")
+        return r
 
     if path == "/api/scan":
+        if cached_nets is None:
+            cold("portal").scan(_app)
+            drop("portal")
         return '{"networks":' + cached_nets + '}'
 
     # === STATE === (handled by fast path in main loop)
@@ -1295,17 +3065,20 @@ def handle_api(method, path, body):
     if path == "/api/ip":
         return '{"ip":"' + current_ip + '","local":"' + MDNS_HOST + '.local"}'
 
+    if path == "/api/peers":
+        return peers_json()
+
+    if path == "/api/stats":
+        return stats_json()
+
     if path == "/api/mem":
-        gc.collect()
-        free = gc.mem_free()
-        alloc = gc.mem_alloc()
-        r = '{"free":' + str(free) + ',"alloc":' + str(alloc) + ',"min":' + str(_mem_min) + ',"uptime":' + str(time.ticks_diff(time.ticks_ms(), boot_time) // 1000)
-        r += ',"log":['
-        for i, entry in enumerate(_mem_log):
-            if i > 0:
-                r += ','
-            r += '[' + str(entry[0]) + ',' + str(entry[1]) + ']'
-        r += ']}'
+        r = cold("maint").mem_json(_app)
+        drop("maint")
+        return r
+
+    if path == "/api/bench":
+        r = cold("maint").bench(_app)
+        drop("maint")
         return r
 
     # === GAME ===
@@ -1317,6 +3090,10 @@ def handle_api(method, path, body):
             return '{"ok":true,"reward":' + json.dumps(reward) + '}'
         return '{"ok":true}'
 
+    if method == "GET" and path == "/api/summary":
+        # What other units need for the shared leaderboard
+        return json.dumps({"names": state["names"], "scores": state["scores"], "avatars": state["avatars"]})
+
     if method == "POST" and path == "/api/start":
         do_start()
         return '{"ok":true}'
@@ -1325,107 +3102,30 @@ def handle_api(method, path, body):
         do_skip()
         return '{"ok":true}'
 
+    if method == "POST" and path == "/api/events":
+        data = json.loads(body)
+        events = data.get("events", []) if isinstance(data, dict) else data
+        try:
+            applied, rewards = do_events(events)
+        except ValueError as e:
+            return '{"ok":false,"error":"' + str(e) + '"}'
+        return '{"ok":true,"applied":' + str(applied) + ',"rewards":' + json.dumps(rewards) + '}'
+
     if method == "POST" and path == "/api/reset":
         do_reset()
         return '{"ok":true}'
 
     # === CONFIG ===
-    if method == "PUT" and path == "/api/names":
-        data = json.loads(body)
-        names = [nm.upper()[:10] for nm in data.get("names", state["names"])]
-        avatars = data.get("avatars", state["avatars"])
-        old_n = len(state["names"])
-        n = len(names)
-        # If players were removed, clean up orphaned fingerprint slots
-        if n < old_n:
-            for slot in range(n, old_n):
-                try:
-                    fp_delete(slot)
-                except:
-                    pass
-        state["names"] = names
-        while len(avatars) < n:
-            avatars.append("\U0001f534")
-        state["avatars"] = avatars[:n]
-        for arr, dv in [("scores", 0), ("streaks", 0)]:
-            while len(state[arr]) < n:
-                state[arr].append(dv)
-            state[arr] = state[arr][:n]
-        while len(state["fp"]) < n:
-            state["fp"].append(False)
-        state["fp"] = state["fp"][:n]
-        while len(state["rewards"]) < n:
-            state["rewards"].append({"10": "Belohnung 🎁", "20": "Größere Belohnung 🌟", "50": "Super Belohnung! 🎉", "100": "Mega Belohnung!! 🏆"})
-        state["rewards"] = state["rewards"][:n]
-        # Resize vacation array
-        g = state["game"]
-        while len(g["vacation"]) < n:
-            g["vacation"].append(False)
-        g["vacation"] = g["vacation"][:n]
-        if state["turn"] >= n:
-            state["turn"] = 0
-        save_state()
-        show_current_state()
-        return '{"ok":true}'
-
-    if method == "PUT" and path == "/api/texts":
-        data = json.loads(body)
-        state["texts"].update(data)
-        save_state()
-        show_current_state()
-        return '{"ok":true}'
+    if method == "PATCH" and path == "/api/config":
+        return _cfg_result(config_update(json.loads(body)))
 
-    if method == "PUT" and path == "/api/display":
-        data = json.loads(body)
-        if "motionTimeout" in data:
-            state["motionTimeout"] = data.pop("motionTimeout")
-        if "pirEnabled" in data:
-            state["pirEnabled"] = data.pop("pirEnabled")
-        state["display"].update(data)
-        led_brightness(state["display"].get("brightness", 5))
-        scroll["speed"] = state["display"].get("scrollSpeed", 30)
-        save_state()
-        return '{"ok":true}'
+    if method == "PUT" and path[5:] in CONFIG_SECTIONS:
+        return _cfg_result(config_update({path[5:]: json.loads(body)}))
 
     if method == "POST" and path == "/api/sound/test":
         sound_score()
         return '{"ok":true}'
 
-    if method == "PUT" and path == "/api/sound":
-        data = json.loads(body)
-        state["sound"].update(data)
-        save_state()
-        return '{"ok":true}'
-
-    if method == "PUT" and path == "/api/rewards":
-        data = json.loads(body)
-        idx = data.get("player", 0)
-        rewards = data.get("rewards", {})
-        if 0 <= idx < len(state["names"]):
-            state["rewards"][idx] = rewards
-            save_state()
-        return '{"ok":true}'
-
-    if method == "PUT" and path == "/api/game":
-        data = json.loads(body)
-        g = state["game"]
-        if "jumpInScore" in data:
-            g["jumpInScore"] = max(1, min(10, int(data["jumpInScore"])))
-        if "endDate" in data:
-            g["endDate"] = data["endDate"]
-            g["ended"] = False
-            invalidate_days_cache()
-        if "vacation" in data:
-            vac = data["vacation"]
-            n = len(state["names"])
-            g["vacation"] = [(vac[i] if i < len(vac) else False) for i in range(n)]
-            # If current turn player is now on vacation, advance
-            if g["vacation"][state["turn"]]:
-                state["turn"] = next_active_turn(state["turn"])
-        save_state()
-        show_current_state()
-        return '{"ok":true}'
-
     if method == "POST" and path == "/api/game/restart":
         state["game"]["ended"] = False
         save_state()
@@ -1434,40 +3134,88 @@ def handle_api(method, path, body):
 
     # === FINGERPRINT API ===
     if method == "POST" and path == "/api/fp/enroll":
+        # Adds a finger for the player ("slot" is the player index, as before)
         data = json.loads(body)
-        slot = data.get("slot", 0)
-        if 0 <= slot < len(state["names"]):
-            print("FP enroll request for slot", slot)
-            ok = fp_enroll(slot)
+        player = data.get("player", data.get("slot", 0))
+        if 0 <= player < len(state["names"]):
+            slot = fp_alloc()
+            if slot < 0:
+                return '{"ok":false,"error":"Sensor voll"}'
+            print("FP enroll request for player", player, "slot", slot)
+            ok = fp_enroll(slot, player)
             if ok:
-                state["fp"][slot] = True
+                fp_assign(slot, player)
                 save_state()
                 show_current_state()
-                return '{"ok":true,"message":"enrolled"}'
+                return '{"ok":true,"message":"enrolled","slot":' + str(slot) + ',"fingers":' + str(len(fp_fingers(player))) + '}'
             else:
                 show_current_state()
                 return '{"ok":false,"error":"Registrierung fehlgeschlagen"}'
         return '{"ok":false,"error":"invalid slot"}'
 
     if method == "POST" and path == "/api/fp/delete":
+        # {"finger": sensor slot} deletes one finger, {"slot": player} all of them
         data = json.loads(body)
-        slot = data.get("slot", 0)
-        if 0 <= slot < len(state["names"]):
+        if "finger" in data:
+            slot = data["finger"]
+            if not isinstance(slot, int) or fp_player(slot) < 0:
+                return '{"ok":false}'
             fp_delete(slot)
-            state["fp"][slot] = False
+            fp_assign(slot, -1)
+            save_state()
+            return '{"ok":true}'
+        player = data.get("player", data.get("slot", 0))
+        if isinstance(player, int) and 0 <= player < len(state["names"]):
+            fp_forget(player)
             save_state()
             return '{"ok":true}'
         return '{"ok":false}'
 
     if method == "PUT" and path == "/api/fp":
+        # Manual override: unregistering drops the player's fingers from the
+        # map only; registering maps the legacy slot (== player) if it is free
         data = json.loads(body)
         idx = data.get("slot", 0)
         reg = data.get("registered", False)
         if 0 <= idx < len(state["names"]):
-            state["fp"][idx] = reg
+            if not reg:
+                for slot in fp_fingers(idx):
+                    fp_assign(slot, -1)
+            elif not fp_fingers(idx) and fp_player(idx) < 0:
+                fp_assign(idx, idx)
             save_state()
         return '{"ok":true}'
 
+    if method == "POST" and path == "/api/fp/import":
+        r = cold("fpio").import_one(_app, body)
+        drop("fpio")
+        return r
+
+    if method == "POST" and path == "/api/players/remove":
+        data = json.loads(body)
+        p = data.get("player", -1)
+        n = len(state["names"])
+        if not 0 <= p < n or n <= 1:
+            return '{"ok":false}'
+        players_reorder([i for i in range(n) if i != p])
+        save_state()
+        show_current_state()
+        return '{"ok":true}'
+
+    if method == "POST" and path == "/api/players/move":
+        data = json.loads(body)
+        n = len(state["names"])
+        a = data.get("from", -1)
+        b = data.get("to", -1)
+        if not (0 <= a < n and 0 <= b < n):
+            return '{"ok":false}'
+        order = list(range(n))
+        order.insert(b, order.pop(a))
+        players_reorder(order)
+        save_state()
+        show_current_state()
+        return '{"ok":true}'
+
     if method == "PUT" and path == "/api/wifi":
         data = json.loads(body)
         save_wifi(data["ssid"], data.get("password", ""))
@@ -1480,81 +3228,23 @@ def handle_api(method, path, body):
         return '{"ok":true}'
 
     if method == "POST" and path == "/api/factory-reset":
-        factory_reset()
+        cold("maint").factory_reset(_app)
+        drop("maint")
         def _rb(t):
             reboot("factory_reset")
         machine.Timer(0).init(period=1000, mode=machine.Timer.ONE_SHOT, callback=_rb)
         return '{"ok":true}'
 
-    if method == "POST" and path == "/api/restore":
-        try:
-            data = json.loads(body)
-            for k in ["names", "avatars", "scores", "streaks", "fp", "rewards", "turn", "running", "texts", "display"]:
-                if k in data:
-                    state[k] = data[k]
-            save_state()
-            show_current_state()
-            return '{"ok":true}'
-        except Exception as e:
-            return '{"ok":false,"error":"' + str(e) + '"}'
-
     # === OTA UPDATE API ===
     if method == "GET" and path == "/api/ota/version":
         return '{"version":"' + OTA_VERSION + '"}'
 
-    if method == "POST" and path == "/api/ota/start":
-        gc.collect()
-        data = json.loads(body)
-        fn = data["filename"]
+    if method == "POST" and path.startswith("/api/ota/"):
+        r = cold("ota").handle(_app, path, body)
+        # Stays loaded for the rest of an update session
         if not scroll.get("_ota"):
-            scroll["_ota"] = True
-            scroll_static("UPDATE")
-        try:
-            os.remove(fn + ".new")
-        except:
-            pass
-        with open(fn + ".new", "wb") as f:
-            pass  # Create empty file
-        print("OTA: start", fn)
-        return '{"ok":true}'
-
-    if method == "POST" and path == "/api/ota/chunk":
-        wdt_feed()
-        gc.collect()
-        data = json.loads(body)
-        fn = data["filename"]
-        import ubinascii
-        chunk = ubinascii.a2b_base64(data["data"])
-        with open(fn + ".new", "ab") as f:
-            f.write(chunk)
-        del chunk
-        gc.collect()
-        return '{"ok":true}'
-
-    if method == "POST" and path == "/api/ota/finish":
-        wdt_feed()
-        gc.collect()
-        data = json.loads(body)
-        fn = data["filename"]
-        try:
-            os.remove(fn + ".bak")
-        except:
-            pass
-        try:
-            os.rename(fn, fn + ".bak")
-        except:
-            pass
-        os.rename(fn + ".new", fn)
-        # If dashboard.html updated, remove old .gz so it doesn't take priority
-        if fn == "dashboard.html":
-            try:
-                os.remove("dashboard.gz")
-                print("OTA: removed old dashboard.gz")
-            except:
-                pass
-        print("OTA: finished", fn)
-        gc.collect()
-        return '{"ok":true}'
+            drop("ota")
+        return r
 
     if method == "POST" and path == "/api/reboot":
         def _rb(t):
@@ -1572,14 +3262,21 @@ def start_server():
     s.bind(addr)
     s.listen(3)
     s.settimeout(0)
-    print("Server: http://" + current_ip)
-    gc.collect()
-    print("Free:", gc.mem_free())
+    print("Server: http://" + MDNS_HOST + ".local")
+    boot_mark("http")
 
     # Init hardware
     led_init()
     motion_last_global = time.ticks_ms()
-    show_current_state()
+    init_irqs()
+    if state["device"]["dualCore"]:
+        gfx_start()
+    if ap_mode:
+        scroll_static("SETUP")  # First setup: stays until WiFi is configured
+    else:
+        # Intro scrolls without blocking; the loop shows the game state after it
+        scroll_start("DISH DASH v" + OTA_VERSION, count=1, speed=35)
+    boot_mark("led")
 
     gc_counter = 0
     mem_log_counter = 0
@@ -1587,19 +3284,22 @@ def start_server():
     gc.collect()
     _mem_log.append((0, gc.mem_free()))
     wdt = machine.WDT(timeout=30000)  # 30s watchdog - auto-reboot on hang
+    boot_mark("loop")
     while True:
         wdt.feed()
         # === Network ===
         if ap_mode:
-            check_dns(current_ip)
+            check_dns()
         else:
+            wifi_tick()
             check_mdns(current_ip)
-            check_wifi_reconnect()
+            peers_tick()
 
         # === Hardware ===
+        check_events()
         scroll_tick()
         # Auto-restart scroll when done (replaces callback chain)
-        if scroll["done"] and not scroll["static"] and not scroll.get("_ota") and display_active:
+        if scroll["done"] and not scroll["static"] and not scroll.get("_ota") and display_active and gfx_idle():
             gc.collect()
             show_current_state()
         check_motion()
@@ -1609,6 +3309,8 @@ def start_server():
         if action:
             handle_button(action)
 
+        persist_tick()
+
         # === Memory ===
         gc_counter += 1
         if gc_counter >= 50:
@@ -1652,23 +3354,20 @@ def start_server():
             method = req[:sp1].decode()
             path = req[sp1+1:sp2].decode()
             body = ""
-            
-            # Only parse body for POST/PUT
-            if method in ("POST", "PUT"):
+            rest = None
+
+            if method == "POST" and path == "/api/restore":
+                # Streamed by the backup module, line by line, without a size cap
+                he = req.find(b"\r\n\r\n")
+                if he >= 0:
+                    rest = req[he + 4:]
+                    cl_val = _content_length(req[:he].decode("utf-8", "ignore"))
+            # Only parse body for POST/PUT/PATCH
+            elif method in ("POST", "PUT", "PATCH"):
                 req_str = req.decode("utf-8", "ignore")
                 if "\r\n\r\n" in req_str:
                     hdr, body = req_str.split("\r\n\r\n", 1)
-                    cl_val = 0
-                    cl_idx = hdr.lower().find("content-length:")
-                    if cl_idx >= 0:
-                        cl_end = hdr.find("\r\n", cl_idx)
-                        if cl_end < 0:
-                            cl_end = len(hdr)
-                        try:
-                            cl_val = int(hdr[cl_idx+15:cl_end].strip())
-                        except:
-                            cl_val = 0
-                    cl_val = min(cl_val, 16384)
+                    cl_val = min(_content_length(hdr), 16384)
                     while len(body) < cl_val:
                         try:
                             body += cl.recv(2048).decode("utf-8")
@@ -1680,12 +3379,21 @@ def start_server():
             if method == "OPTIONS":
                 send_cors(cl)
             elif path == "/api/state" and method == "GET":
-                # Fast path: write pre-cached bytes directly, zero alloc
-                _update_state_cache()
-                cl.send(_HDR_JSON)
-                cl.send(_full_resp_cl)
-                cl.send(_HDR_END)
-                cl.send(_full_resp_bytes)
+                send_state(cl)
+            elif path.startswith("/api/history") and method == "GET":
+                send_history(cl, path)
+            elif path == "/api/fp/export" and method == "GET":
+                cold("fpio").export(_app, cl)
+                drop("fpio")
+            elif path == "/api/backup" and method == "GET":
+                cold("backup").export(_app, cl)
+                drop("backup")
+                drop("fpio")
+            elif rest is not None:
+                r = cold("backup").restore(_app, cl, rest, cl_val)
+                drop("backup")
+                drop("fpio")
+                send_resp(cl, r, ct="application/json")
             elif path.startswith("/api/"):
                 r = handle_api(method, path, body)
                 send_resp(cl, r, ct="application/json")
@@ -1698,7 +3406,8 @@ def start_server():
                     send_redirect(cl, "http://192.168.4.1/setup")
                 else:
                     try:
-                        setup_html = get_setup_html()
+                        setup_html = cold("portal").setup_html(_app)
+                        drop("portal")
                         with open("_setup.htm", "w") as sf:
                             sf.write(setup_html)
                         send_file(cl, "_setup.htm")
@@ -1712,7 +3421,8 @@ def start_server():
                 except:
                     send_file(cl, "dashboard.html", cache=604800)
             elif path == "/mem":
-                send_resp(cl, '<!DOCTYPE html><html><head><meta charset=utf-8><meta name=viewport content="width=device-width"><title>Memory</title><style>body{background:#111;color:#fff;font-family:monospace;padding:12px}pre{font-size:11px}canvas{width:100%;height:200px;background:#1a1a1a;border-radius:8px}.r{color:#f66}.g{color:#0d6}</style></head><body><h3>Memory Monitor</h3><pre id=d>Loading...</pre><canvas id=c></canvas><script>async function u(){let r=await fetch("/api/mem");let d=await r.json();let h="Free: <span class=g>"+d.free+"</span> | Min: <span class=r>"+d.min+"</span> | Uptime: "+Math.floor(d.uptime/60)+"min\\n\\n";h+="=== Log (5min intervals) ===\\n";d.log.forEach(function(e){h+=e[0]+"min: "+e[1]+"\\n"});document.getElementById("d").innerHTML=h;if(d.log.length>1){let c=document.getElementById("c");let ctx=c.getContext("2d");c.width=c.offsetWidth;c.height=200;let vals=d.log.map(function(e){return e[1]});let mn=Math.min.apply(null,vals);let mx=Math.max.apply(null,vals);let rng=mx-mn||1;ctx.clearRect(0,0,c.width,c.height);ctx.strokeStyle="#0d6";ctx.lineWidth=2;ctx.beginPath();for(let i=0;i<vals.length;i++){let x=i/(vals.length-1)*c.width;let y=c.height-((vals[i]-mn)/rng)*c.height*0.8-20;if(i===0)ctx.moveTo(x,y);else ctx.lineTo(x,y);}ctx.stroke();ctx.fillStyle="#666";ctx.font="10px monospace";ctx.fillText(mx+"",4,14);ctx.fillText(mn+"",4,c.height-4);}}u();setInterval(u,10000);</script></body></html>')
+                send_resp(cl, cold("maint").mem_page())
+                drop("maint")
             elif path == "/manifest.json":
                 mf = '{"name":"Dish Dash","short_name":"DishDash","start_url":"/","display":"standalone","background_color":"#0a0a0f","theme_color":"#0a0a0f","icons":[{"src":"/icon.svg","sizes":"any","type":"image/svg+xml"}]}'
                 send_resp(cl, mf, ct="application/json")
@@ -1734,9 +3444,12 @@ def start_server():
                 pass
 
 # === MAIN ===
+# Staged boot: state, LED and inputs come up first and the game loop starts
+# right away; WiFi, mDNS and HTTP come up from inside the loop.
 print()
 print("  DISH DASH v" + OTA_VERSION)
 print()
+boot_mark("import")
 
 # Boot counter + reboot reason
 boot_count = 0
@@ -1759,46 +3472,15 @@ boot_time = time.ticks_ms()
 print("  Boot #" + str(boot_count) + " reason: " + last_reboot_reason)
 
 load_state()
+history_init()
 load_network()
-
-# Quick LED test
-led_init()
-scroll_start("DISH DASH v" + OTA_VERSION, count=1, speed=35)
-while not scroll["done"]:
-    scroll_tick()
+boot_mark("state")
 gc.collect()
 print("Free:", gc.mem_free())
-time.sleep(1)
 
 if load_wifi():
-    scroll_start("VERBINDE WIFI...", count=99, speed=12)
-    gc.collect()
-    wifi_ok = False
-    for _try in range(3):
-        if connect_wifi():
-            wifi_ok = True
-            break
-        print("WiFi Versuch " + str(_try + 1) + " fehlgeschlagen, retry...")
-        time.sleep(2)
-    if wifi_ok:
-        # Blinking LOADING for 5 seconds
-        cols = text_to_cols("BOOT")
-        pad = max(0, (LED_W - len(cols)) // 2)
-        load_buf = [0] * pad + cols + [0] * LED_W
-        for i in range(10):
-            led_display_frame(load_buf, 0)
-            time.sleep_ms(300)
-            led_clear()
-            time.sleep_ms(200)
-        gc.collect()
-        start_server()
-    else:
-        print("-> AP Modus (Fallback)")
-        start_ap()
-        scroll_static("SETUP")
-        start_server()
+    wifi_begin()
 else:
     print("-> AP Modus (Ersteinrichtung)")
     start_ap()
-    scroll_static("SETUP")
-    start_server()
+start_server()
@@ -0,0 +1,276 @@
+# Dish Dash backup download and restore (GET /api/backup, POST /api/restore).
+# Imported on demand by app.py and dropped again afterwards; `a` is the app
+# module.
+#
+# The download is one JSON object, the state keys followed by
+# "fingerprints" (see fpio), written through the app's JSON stream.
+# A restore arrives as newline-separated JSON objects:
+#   {"names":[...]}
+#   {"rewards":[{...}],"at":3}
+#   {"texts":{"point":"..."}}
+#   {"fingerprint":{"slot":3,"player":1,"data":"..."}}
+# A list section may come in several lines, each continuing the list where
+# the last one ended ("at", default 0); texts, display and game lines are
+# merged. So a line holds one entry at most and only that has to fit in
+# LINE_MAX, never a whole section or the backup.
+#
+# Each line is checked and applied to the state as it arrives; templates
+# are checked and staged in FP_TMP on flash. Once the last line has passed
+# the cross-checks (list lengths against the names, players of slots and
+# templates), the templates go to the sensor one at a time. If anything is
+# refused the state is read back from state.bin, which was written just
+# before, and the sensor was never touched. Lists the backup lacks keep
+# their current values, cut or padded to the restored player count.
+import json
+import os
+import struct
+
+LINE_MAX = 8192
+FP_TMP = "restore.fp"
+RESTORE_KEYS = ("names", "avatars", "scores", "streaks", "fp", "slots", "rewards", "turn", "running", "texts", "display", "game")
+LISTS = ("names", "avatars", "scores", "streaks", "fp", "rewards", "slots")
+REWARDS = {"10": "Belohnung 🎁", "20": "Größere Belohnung 🌟", "50": "Super Belohnung! 🎉", "100": "Mega Belohnung!! 🏆"}
+
+def export(a, cl):
+    fpio = a.cold("fpio")
+    a.json_begin(cl)
+    a.json_raw("{")
+    first = True
+    for k in a.state:
+        a.json_key(k, first)
+        a.json_value(a.state[k])
+        first = False
+    a.json_key("fingerprints")
+    fpio.write_templates(a)
+    a.json_raw("}")
+    a.json_end()
+
+def _lines(cl, rest, length):
+    """Yield the body's lines (bytes) as they arrive, None for an overlong one"""
+    buf = rest
+    left = length - len(rest)
+    while True:
+        i = buf.find(b"\n")
+        if i >= 0:
+            yield buf[:i] if i <= LINE_MAX else None
+            buf = buf[i + 1:]
+            continue
+        if len(buf) > LINE_MAX:
+            yield None
+            return
+        if left <= 0:
+            break
+        try:
+            chunk = cl.recv(min(2048, left))
+        except:
+            chunk = b""
+        if not chunk:
+            break
+        left -= len(chunk)
+        buf += chunk
+    if buf:
+        yield buf
+
+def _fit(v, n, dv):
+    """A copy of a current per-player list cut or padded to n entries"""
+    v = v[:n]
+    while len(v) < n:
+        v.append(dv.copy() if isinstance(dv, dict) else dv)
+    return v
+
+def _count(v):
+    if not isinstance(v, int) or isinstance(v, bool) or v < 0:
+        raise ValueError
+    return v
+
+def _item(a, k, v):
+    """One entry of list section k, converted; ValueError(k) if refused"""
+    try:
+        if k == "names":
+            return a._cfg_str(v).upper()[:10]
+        if k == "avatars":
+            return a._cfg_str(v)
+        if k == "fp":
+            return a._cfg_bool(v)
+        if k == "rewards":
+            return a._cfg_strs(v)
+        if k == "slots":
+            # Player, or -1 for a free slot; checked against the names at the end
+            if not isinstance(v, int) or isinstance(v, bool) or v < -1:
+                raise ValueError
+            return v
+        return _count(v)
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(k)
+
+def _apply(a, d, rs):
+    """Check one line and apply it: lists and texts to the state, the rest
+    (small, with side effects or cross-checks) to rs for _finish"""
+    st = a.state
+    at = d.get("at", 0)
+    for k in d:
+        if k not in RESTORE_KEYS:
+            continue
+        v = d[k]
+        if k in LISTS:
+            if not isinstance(v, list) or not isinstance(at, int):
+                raise ValueError(k)
+            if at == 0:
+                st[k] = []
+                if k not in rs["seen"]:
+                    rs["seen"].append(k)
+            elif k not in rs["seen"] or at != len(st[k]):
+                raise ValueError(k)
+            lst = st[k]
+            for x in v:
+                lst.append(_item(a, k, x))
+        elif k == "texts":
+            st["texts"].update(a._cfg_norm({"texts": v})["texts"])
+        elif k == "display":
+            rs["display"].update(a._cfg_norm({"display": v})["display"])
+        elif k == "game":
+            rs["game"].update(a._cfg_norm({"game": v})["game"])
+            if "ended" in v:
+                try:
+                    rs["ended"] = a._cfg_bool(v["ended"])
+                except TypeError:
+                    raise ValueError("game")
+        elif k == "turn":
+            try:
+                rs["turn"] = _count(v)
+            except ValueError:
+                raise ValueError("turn")
+        else:
+            try:
+                rs["running"] = a._cfg_bool(v)
+            except TypeError:
+                raise ValueError("running")
+
+def _receive(a, fpio, cl, rest, length, rs, f):
+    """Apply the body line by line, templates go to f. Returns their count."""
+    fps = 0
+    for line in _lines(cl, rest, length):
+        a.wdt_feed()
+        if line is None:
+            raise ValueError("Zeile zu lang")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            d = json.loads(line.decode("utf-8"))
+        except:
+            raise ValueError("Ungültige Zeile")
+        line = None
+        if not isinstance(d, dict):
+            raise ValueError("Ungültige Zeile")
+        t = d.get("fingerprint")
+        if t is not None:
+            # The player is checked against the final names in _finish
+            tpl = fpio.unhex(t) if fpio.valid(a, t, a.MAX_PLAYERS) else None
+            if tpl is None:
+                raise ValueError("Ungültiger Fingerabdruck")
+            f.write(struct.pack("<BBH", t["slot"], t["player"], len(tpl)))
+            f.write(tpl)
+            rs["fpMax"] = max(rs["fpMax"], t["player"])
+            fps += 1
+        _apply(a, d, rs)
+        d = t = tpl = None
+    return fps
+
+def _finish(a, rs):
+    """Cross-check everything against the restored names, then apply rs.
+    Raises ValueError before the first change it makes."""
+    st = a.state
+    seen = rs["seen"]
+    n = len(st["names"])
+    if not 1 <= n <= a.MAX_PLAYERS:
+        raise ValueError("names")
+    for k in ("avatars", "scores", "streaks", "fp", "rewards"):
+        if k in seen and len(st[k]) != n:
+            raise ValueError(k)
+    if "slots" in seen:
+        if len(st["slots"]) > a.FP_LIB_SIZE:
+            raise ValueError("slots")
+        for p in st["slots"]:
+            if p >= n:
+                raise ValueError("slots")
+    g = rs["game"]
+    if "vacation" in g and len(g["vacation"]) != n:
+        raise ValueError("game")
+    if rs["fpMax"] >= n:
+        raise ValueError("Ungültiger Fingerabdruck")
+    t = rs.get("turn", st["turn"])
+    if t >= n:
+        if "turn" in rs:
+            raise ValueError("turn")
+        t = 0
+    # Nothing below can fail
+    for k, dv in (("avatars", "\U0001f534"), ("scores", 0), ("streaks", 0), ("fp", False), ("rewards", REWARDS)):
+        if k not in seen:
+            st[k] = _fit(st[k], n, dv)
+    if "vacation" not in g:
+        g["vacation"] = _fit(st["game"]["vacation"], n, False)
+    if "ended" in rs:
+        g["ended"] = rs["ended"]
+    st["game"].update(g)
+    a.invalidate_days_cache()
+    st["turn"] = t
+    if "running" in rs:
+        st["running"] = rs["running"]
+    if rs["display"]:
+        a._cfg_display(rs["display"])
+
+def _remove(fn):
+    try:
+        os.remove(fn)
+    except OSError:
+        pass
+
+def restore(a, cl, rest, length):
+    """Apply a line-by-line backup. Returns the JSON response."""
+    fpio = a.cold("fpio")
+    # The snapshot is the way back if a later line is refused
+    a.save_state()
+    a.flush_state()
+    if a._save_first is not None:
+        return a._cfg_result("Speicher")
+    state = a.state
+    old_n = len(state["names"])
+    rs = {"seen": [], "display": {}, "game": {}, "fpMax": -1}
+    try:
+        with open(FP_TMP, "wb") as f:
+            fps = _receive(a, fpio, cl, rest, length, rs, f)
+        _finish(a, rs)
+    except (ValueError, OSError) as e:
+        try:
+            a._read_state("state.bin")
+        except Exception as e2:
+            print("Restore rollback: " + str(e2))
+        _remove(FP_TMP)
+        return a._cfg_result(str(e) if isinstance(e, ValueError) else "Speicher")
+    n = len(state["names"])
+    if n < old_n:
+        a.history_remap(list(range(n)))
+    if "slots" not in rs["seen"] and not fps:
+        state["slots"] = a.fp_slots_from_flags(state["fp"])
+    stored = 0
+    try:
+        with open(FP_TMP, "rb") as f:
+            for _ in range(fps):
+                slot, p, k = struct.unpack("<BBH", f.read(4))
+                tpl = f.read(k)
+                a.wdt_feed()
+                if fpio.store(a, slot, tpl) is None:
+                    a.fp_assign(slot, p)
+                    stored += 1
+                tpl = None
+    except OSError as e:
+        print("Restore templates: " + str(e))
+    _remove(FP_TMP)
+    a.fp_sync()
+    a.stats_resize(n)
+    a.stats_rank()
+    a.save_state()
+    a.flush_state()
+    a.show_current_state()
+    return '{"ok":true,"fingers":' + str(stored) + ',"failed":' + str(fps - stored) + '}'
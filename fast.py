@@ -0,0 +1,78 @@
+# Dish Dash native hot paths (viper). Only loadable from an xtensawin build;
+# app.py falls back to its pure-Python versions when the import fails.
+import micropython
+
+@micropython.viper
+def frame(cols, n: int, offset: int, out, nmod: int) -> int:
+    src = ptr8(cols)
+    dst = ptr8(out)
+    dirty = 0
+    i = 0
+    for row in range(8):
+        mask = 0x80 if row == 0 else 1 << (row - 1)
+        c = offset
+        for m in range(nmod):
+            b = 0
+            bit = 0x80
+            while bit:
+                if c >= 0 and c < n and (src[c] & mask):
+                    b |= bit
+                bit >>= 1
+                c += 1
+            if dst[i + 1] != b:
+                dst[i + 1] = b
+                dirty |= 1 << row
+            i += 2
+    return dirty
+
+@micropython.viper
+def csum(buf, start: int, end: int) -> int:
+    p = ptr8(buf)
+    s = 0
+    for i in range(start, end):
+        s += p[i]
+    return s
+
+@micropython.viper
+def dns_skip(d, p: int, n: int) -> int:
+    b = ptr8(d)
+    while p < n:
+        ln = b[p]
+        if ln == 0:
+            return p + 1
+        if ln & 0xC0 == 0xC0:
+            return p + 2
+        p += ln + 1
+    return n
+
+@micropython.viper
+def dns_match(d, p: int, n: int, name) -> bool:
+    b = ptr8(d)
+    q = ptr8(name)
+    i = 0
+    hops = 0
+    while p < n:
+        ln = b[p]
+        if ln & 0xC0 == 0xC0:
+            if p + 1 >= n or hops > 8:
+                return False
+            p = ((ln & 0x3F) << 8) | b[p + 1]
+            hops += 1
+            continue
+        if ln != q[i]:
+            return False
+        if ln == 0:
+            return True
+        if p + ln >= n:
+            return False
+        k = 1
+        while k <= ln:
+            c = b[p + k]
+            if c >= 65 and c <= 90:
+                c += 32
+            if c != q[i + k]:
+                return False
+            k += 1
+        i += ln + 1
+        p += ln + 1
+    return False
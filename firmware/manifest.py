@@ -0,0 +1,4 @@
+# Freeze manifest for the optional firmware build (see .github/workflows/build.yml)
+include("$(PORT_DIR)/boards/manifest.py")
+for m in ("app", "ota", "portal", "maint", "fpio", "backup", "fast"):
+    module(m + ".py", base_path="..", opt=2)
@@ -0,0 +1,161 @@
+# Dish Dash fingerprint template export/import (AS608 LoadChar + UpChar,
+# DownChar + Store). Imported on demand by app.py and dropped again
+# afterwards; `a` is the app module.
+#
+# A template (512 bytes on the AS608) travels as data packets (pid 0x02,
+# last one 0x08) of the sensor's packet size, 128 bytes by default. Each
+# template is read into one fixed buffer before it goes out as hex, so a
+# slow client can't overflow the UART receive buffer mid-template. The
+# backup module reuses write_templates(), valid(), unhex() and store().
+import json
+import time
+from ubinascii import hexlify, unhexlify
+
+PKT_DATA = 128
+_PID_DATA = 0x02
+_PID_END = 0x08
+
+_tpl = bytearray(1024)
+_hdr = bytearray(9)
+_pkt = bytearray(b"\xEF\x01\xFF\xFF\xFF\xFF" + bytes(3 + PKT_DATA + 2))
+
+def _read(uart, mv, timeout=1000):
+    """Fill mv from the sensor UART. Returns False on timeout."""
+    got = 0
+    t0 = time.ticks_ms()
+    while got < len(mv):
+        if uart.any():
+            got += uart.readinto(mv[got:]) or 0
+        elif time.ticks_diff(time.ticks_ms(), t0) > timeout:
+            return False
+        else:
+            time.sleep_ms(2)
+    return True
+
+def _upload(a, slot):
+    """Load the template at slot and read it into _tpl. Returns its length or -1."""
+    r = a.fp_cmd(a._fp_frame(bytes([0x07, 0x01, slot >> 8, slot & 0xFF])))
+    if a.fp_code(r) != 0:
+        return -1
+    r = a.fp_cmd(a._fp_frame(b"\x08\x01"))
+    if a.fp_code(r) != 0:
+        return -1
+    n = 0
+    tpl = memoryview(_tpl)
+    while True:
+        if not _read(a.fp_uart, memoryview(_hdr)) or _hdr[0] != 0xEF or _hdr[1] != 0x01:
+            return -1
+        pid = _hdr[6]
+        ln = ((_hdr[7] << 8) | _hdr[8]) - 2
+        if ln < 0 or n + ln + 2 > len(_tpl):
+            return -1
+        if not _read(a.fp_uart, tpl[n:n + ln + 2]):
+            return -1
+        s = _hdr[6] + _hdr[7] + _hdr[8] + a._fp_sum(_tpl, n, n + ln)
+        if (s & 0xFFFF) != ((_tpl[n + ln] << 8) | _tpl[n + ln + 1]):
+            return -1
+        n += ln
+        if pid == _PID_END:
+            return n
+        if pid != _PID_DATA:
+            return -1
+
+def write_templates(a):
+    """Write every mapped template as [{"slot","player","data"}, ...] to the
+    app's JSON stream (a.json_begin must have been called)"""
+    a.fp_enrolling = True  # Keep check_fingerprint off the UART
+    a.json_raw("[")
+    first = True
+    try:
+        for slot, p in enumerate(a.state["slots"]):
+            if p < 0:
+                continue
+            a.wdt_feed()
+            n = _upload(a, slot)
+            if n < 0:
+                print("FP export: slot", slot, "failed")
+                continue
+            a.json_raw(('' if first else ',') + '{"slot":' + str(slot) + ',"player":' + str(p) + ',"data":"')
+            mv = memoryview(_tpl)
+            for i in range(0, n, PKT_DATA):
+                a.json_raw(hexlify(mv[i:min(n, i + PKT_DATA)]))
+            a.json_raw('"}')
+            first = False
+    finally:
+        a.fp_enrolling = False
+    a.json_raw("]")
+
+def export(a, cl):
+    """Stream every mapped template: {"templates":[...]}"""
+    a.json_begin(cl)
+    a.json_raw('{"templates":')
+    write_templates(a)
+    a.json_raw("}")
+    a.json_end()
+
+def _download(a, tpl):
+    """Send template bytes to char buffer 1 in PKT_DATA-sized packets"""
+    r = a.fp_cmd(a._fp_frame(b"\x09\x01"))
+    if a.fp_code(r) != 0:
+        return False
+    n = len(tpl)
+    for i in range(0, n, PKT_DATA):
+        k = min(PKT_DATA, n - i)
+        ln = k + 2
+        _pkt[6] = _PID_END if i + k >= n else _PID_DATA
+        _pkt[7] = ln >> 8
+        _pkt[8] = ln & 0xFF
+        _pkt[9:9 + k] = tpl[i:i + k]
+        s = a._fp_sum(_pkt, 6, 9 + k)
+        _pkt[9 + k] = (s >> 8) & 0xFF
+        _pkt[10 + k] = s & 0xFF
+        a.fp_uart.write(memoryview(_pkt)[:11 + k])
+    time.sleep_ms(50)
+    return True
+
+def store(a, slot, tpl):
+    """Write template bytes (see unhex) to sensor slot. Returns an error or None."""
+    a.fp_enrolling = True
+    try:
+        a.wdt_feed()
+        if not _download(a, tpl):
+            return "DownChar"
+        r = a.fp_cmd(a._fp_patch_slot(a._fp_store, 11, a._fp_store_sum, slot))
+        if a.fp_code(r) != 0:
+            return "Store"
+    finally:
+        a.fp_enrolling = False
+    return None
+
+def valid(a, d, n):
+    """Is d a {"slot", "player", "data"} template for one of n players?"""
+    if not isinstance(d, dict):
+        return False
+    slot = d.get("slot", -1)
+    p = d.get("player", -1)
+    data = d.get("data", "")
+    if not isinstance(slot, int) or not isinstance(p, int) or not isinstance(data, str):
+        return False
+    return 0 <= slot < a.FP_LIB_SIZE and 0 <= p < n and bool(data) and not len(data) % 2
+
+def unhex(d):
+    """The template bytes of a valid d, None if its data is not hex"""
+    try:
+        return unhexlify(d["data"])
+    except:
+        return None
+
+def import_one(a, body):
+    """{"slot", "player", "data"} -> stores the template and maps the slot"""
+    d = json.loads(body)
+    if not valid(a, d, len(a.state["names"])):
+        return '{"ok":false,"error":"invalid"}'
+    tpl = unhex(d)
+    if tpl is None:
+        return '{"ok":false,"error":"invalid"}'
+    err = store(a, d["slot"], tpl)
+    if err:
+        return '{"ok":false,"error":"' + err + '"}'
+    a.fp_assign(d["slot"], d["player"])
+    a.save_state()
+    return '{"ok":true}'
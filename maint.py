@@ -0,0 +1,65 @@
+# Dish Dash maintenance: factory reset and the memory monitor.
+# Imported on demand by app.py and dropped again afterwards; `a` is the
+# app module.
+import os
+import json
+import time
+import gc
+
+def factory_reset(a):
+    a.save_discard()
+    for fn in ["state.bin", "state.bnew", "state.json", "state.tmp", "wifi.json", "network.json", "boots.txt", "reboot.txt", a.HIST_FN]:
+        try:
+            os.remove(fn)
+            print("Removed: " + fn)
+        except:
+            pass
+
+def mem_json(a):
+    gc.collect()
+    free = gc.mem_free()
+    alloc = gc.mem_alloc()
+    r = '{"free":' + str(free) + ',"alloc":' + str(alloc) + ',"min":' + str(a._mem_min) + ',"uptime":' + str(time.ticks_diff(time.ticks_ms(), a.boot_time) // 1000)
+    r += ',"log":['
+    for i, entry in enumerate(a._mem_log):
+        if i > 0:
+            r += ','
+        r += '[' + str(entry[0]) + ',' + str(entry[1]) + ']'
+    r += '],"mods":' + json.dumps(a.cold_sizes)
+    s = a.led_stats
+    r += ',"spi":{"frames":' + str(s["frames"]) + ',"bytes":' + str(s["bytes"]) + ',"rowsSkipped":' + str(s["skipped"])
+    r += ',"perFrame":' + str(s["bytes"] // s["frames"] if s["frames"] else 0) + '}'
+    n = s["scrollFrames"]
+    r += ',"scroll":{"frames":' + str(n) + ',"colsSkipped":' + str(s["colsSkipped"])
+    r += ',"jitterAvg":' + str(s["jitterSum"] // n if n else 0) + ',"jitterMax":' + str(s["jitterMax"]) + '}'
+    f = a.fp_stats
+    n = f["n"]
+    r += ',"fp":{"n":' + str(n) + ',"latencyAvg":' + str(f["latSum"] // n if n else 0) + ',"latencyMax":' + str(f["latMax"])
+    r += ',"searchAvg":' + str(f["searchSum"] // n if n else 0) + ',"highSpeed":' + ("true" if a.state["device"]["fpHighSpeed"] else "false") + '}}'
+    return r
+
+def mem_page():
+    return '<!DOCTYPE html><html><head><meta charset=utf-8><meta name=viewport content="width=device-width"><title>Memory</title><style>body{background:#111;color:#fff;font-family:monospace;padding:12px}pre{font-size:11px}canvas{width:100%;height:200px;background:#1a1a1a;border-radius:8px}.r{color:#f66}.g{color:#0d6}</style></head><body><h3>Memory Monitor</h3><pre id=d>Loading...</pre><canvas id=c></canvas><script>async function u(){let r=await fetch("/api/mem");let d=await r.json();let h="Free: <span class=g>"+d.free+"</span> | Min: <span class=r>"+d.min+"</span> | Uptime: "+Math.floor(d.uptime/60)+"min\\n\\n";if(d.mods)h+="Module (B beim Import): "+JSON.stringify(d.mods)+"\\n\\n";if(d.spi)h+="SPI: "+d.spi.perFrame+" B/Frame, "+d.spi.rowsSkipped+" Zeilen gespart\\n\\n";if(d.scroll)h+="Scroll: Jitter "+d.scroll.jitterAvg+"/"+d.scroll.jitterMax+" ms (avg/max), "+d.scroll.colsSkipped+" Spalten übersprungen\\n\\n";if(d.fp&&d.fp.n)h+="Finger: "+d.fp.latencyAvg+"/"+d.fp.latencyMax+" ms Berührung→Punkt (avg/max), Suche "+d.fp.searchAvg+" ms"+(d.fp.highSpeed?" (HighSpeed)":"")+"\\n\\n";h+="=== Log (5min intervals) ===\\n";d.log.forEach(function(e){h+=e[0]+"min: "+e[1]+"\\n"});document.getElementById("d").innerHTML=h;if(d.log.length>1){let c=document.getElementById("c");let ctx=c.getContext("2d");c.width=c.offsetWidth;c.height=200;let vals=d.log.map(function(e){return e[1]});let mn=Math.min.apply(null,vals);let mx=Math.max.apply(null,vals);let rng=mx-mn||1;ctx.clearRect(0,0,c.width,c.height);ctx.strokeStyle="#0d6";ctx.lineWidth=2;ctx.beginPath();for(let i=0;i<vals.length;i++){let x=i/(vals.length-1)*c.width;let y=c.height-((vals[i]-mn)/rng)*c.height*0.8-20;if(i===0)ctx.moveTo(x,y);else ctx.lineTo(x,y);}ctx.stroke();ctx.fillStyle="#666";ctx.font="10px monospace";ctx.fillText(mx+"",4,14);ctx.fillText(mn+"",4,c.height-4);}}u();setInterval(u,10000);</script></body></html>'
+
+def _time(fn, args, n):
+    t0 = time.ticks_us()
+    for _ in range(n):
+        fn(*args)
+    return time.ticks_diff(time.ticks_us(), t0) // n
+
+def bench(a, n=100):
+    """Microseconds per call of each hot path: [python, native or null]"""
+    gc.collect()
+    cols = bytearray(a.LED_W) + a.text_to_cols("DISH DASH 123") + bytearray(a.LED_W)
+    pkt = a._fp_frame(b"\x04\x01\x00\x00\x00\xA3")
+    name = a._dns_name(a.MDNS_HOST + ".local")
+    q = bytes(12) + name + b"\x00\x01\x00\x01"
+    f = a.fast
+    r = {}
+    for fn, py, nat, args in (
+            ("frame", a._frame_py, f and f.frame, (cols, len(cols), 7, bytearray(len(a._frame_buf)), a.LED_NUM)),
+            ("csum", a._fp_sum_py, f and f.csum, (pkt, 6, len(pkt) - 2)),
+            ("dns_skip", a._dns_skip_py, f and f.dns_skip, (q, 12, len(q))),
+            ("dns_match", a._dns_match_py, f and f.dns_match, (q, 12, len(q), name))):
+        r[fn] = [_time(py, args, n), _time(nat, args, n) if nat else None]
+    return json.dumps(r)
@@ -0,0 +1,65 @@
+# Dish Dash OTA upload: /api/ota/start, /chunk and /finish.
+# Imported on demand by app.py and kept loaded while an update is running;
+# `a` is the app module.
+import json
+import os
+import gc
+
+def handle(a, path, body):
+    if path == "/api/ota/start":
+        a.flush_state()
+        gc.collect()
+        data = json.loads(body)
+        fn = data["filename"]
+        if not a.scroll.get("_ota"):
+            a.scroll["_ota"] = True
+            a.scroll_static("UPDATE")
+        try:
+            os.remove(fn + ".new")
+        except:
+            pass
+        with open(fn + ".new", "wb") as f:
+            pass  # Create empty file
+        print("OTA: start", fn)
+        return '{"ok":true}'
+
+    if path == "/api/ota/chunk":
+        a.wdt_feed()
+        gc.collect()
+        data = json.loads(body)
+        fn = data["filename"]
+        import ubinascii
+        chunk = ubinascii.a2b_base64(data["data"])
+        with open(fn + ".new", "ab") as f:
+            f.write(chunk)
+        del chunk
+        gc.collect()
+        return '{"ok":true}'
+
+    if path == "/api/ota/finish":
+        a.flush_state()
+        a.wdt_feed()
+        gc.collect()
+        data = json.loads(body)
+        fn = data["filename"]
+        try:
+            os.remove(fn + ".bak")
+        except:
+            pass
+        try:
+            os.rename(fn, fn + ".bak")
+        except:
+            pass
+        os.rename(fn + ".new", fn)
+        # If dashboard.html updated, remove old .gz so it doesn't take priority
+        if fn == "dashboard.html":
+            try:
+                os.remove("dashboard.gz")
+                print("OTA: removed old dashboard.gz")
+            except:
+                pass
+        print("OTA: finished", fn)
+        gc.collect()
+        return '{"ok":true}'
+
+    return '{"error":"not found"}'
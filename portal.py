@@ -0,0 +1,128 @@
+# Dish Dash setup portal: WiFi scan, setup page and /api/setup.
+# Imported on demand by app.py and dropped again afterwards; `a` is the
+# app module.
+import network
+import json
+import time
+import machine
+import gc
+
+def scan(a):
+    """Scan WiFi networks into a.cached_nets (JSON list of {s, r})"""
+    gc.collect()
+    print("Scanne WLANs... Free:", gc.mem_free())
+    sta = network.WLAN(network.STA_IF)
+    was = sta.active()  # A background reconnect may be using the station
+    if not was:
+        sta.active(True)
+        time.sleep(3)
+    try:
+        raw = sta.scan()
+        seen = set()
+        result = []
+        for n in raw:
+            try:
+                ssid = n[0].decode("utf-8").strip()
+            except:
+                continue
+            if not ssid or ssid in seen:
+                continue
+            seen.add(ssid)
+            rssi = n[3]
+            if rssi > -50: sig = "████"
+            elif rssi > -65: sig = "███░"
+            elif rssi > -75: sig = "██░░"
+            else: sig = "█░░░"
+            result.append({"s": ssid, "r": sig})
+        result.sort(key=lambda x: x["s"].lower())
+        a.cached_nets = json.dumps(result)
+        print("  " + str(len(result)) + " Netzwerke")
+    except Exception as e:
+        print("  Scan err: " + str(e))
+        a.cached_nets = "[]"
+    if not was:
+        sta.active(False)
+        time.sleep(1)
+    gc.collect()
+
+def setup_html(a):
+    if a.cached_nets is None:
+        scan(a)  # Fallback AP: first page request since the AP came up
+    nl = ""
+    try:
+        nets = json.loads(a.cached_nets)
+        for i, n in enumerate(nets):
+            s = n["s"].replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;")
+            nl += '<div class="n" data-s="' + s + '"><span>' + s + '</span><span class="r">' + n["r"] + '</span></div>'
+    except:
+        pass
+    if not nl:
+        nl = '<div style="text-align:center;padding:12px;color:#666;font-size:12px">Keine Netzwerke gefunden.<br>Nutze die manuelle Eingabe.</div>'
+    h = '<!DOCTYPE html><html><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1"><title>Dish Dash Setup</title><style>'
+    h += '*{box-sizing:border-box;margin:0;padding:0}body{background:#0a0a0f;color:#e8e8ef;font-family:system-ui,sans-serif;min-height:100vh;display:flex;align-items:center;justify-content:center;padding:20px}'
+    h += '.c{background:rgba(255,255,255,.06);border:1px solid rgba(255,255,255,.1);border-radius:16px;padding:28px;max-width:380px;width:100%}'
+    h += 'h1{font-size:22px;text-align:center}.sub{font-size:10px;color:#555;text-align:center;letter-spacing:3px;margin:4px 0 24px}'
+    h += 'label{font-size:12px;color:#888;display:block;margin:14px 0 6px}'
+    h += 'input{width:100%;padding:11px;background:rgba(255,255,255,.04);border:1px solid rgba(255,255,255,.08);border-radius:8px;color:#fff;font-size:14px;outline:none}input:focus{border-color:#00d68f}'
+    h += '.btn{width:100%;padding:13px;border:none;border-radius:10px;color:#fff;font-size:14px;font-weight:600;cursor:pointer;margin-top:18px;background:linear-gradient(135deg,#00d68f,#00b377)}'
+    h += '.st{text-align:center;margin-top:14px;font-size:13px;color:#888;line-height:1.7}'
+    h += '.nl{max-height:200px;overflow-y:auto;margin-top:8px}'
+    h += '.n{padding:10px 12px;background:rgba(255,255,255,.03);border:1px solid rgba(255,255,255,.05);border-radius:8px;margin-bottom:4px;cursor:pointer;font-size:13px;display:flex;justify-content:space-between}'
+    h += '.n:hover,.n.a{background:rgba(0,214,143,.12);border-color:rgba(0,214,143,.25)}.n .r{font-size:11px;color:#555;font-family:monospace}'
+    h += '.e{color:#ff4d6a}.ic{text-align:center;font-size:36px;margin-bottom:12px}'
+    h += '.or{font-size:12px;color:#555;text-align:center;margin:12px 0;display:flex;align-items:center;gap:8px}.or::before,.or::after{content:"";flex:1;height:1px;background:rgba(255,255,255,.06)}'
+    h += '.ok{background:rgba(0,214,143,.08);border:1px solid rgba(0,214,143,.2);border-radius:12px;padding:24px;text-align:center;margin-top:16px}'
+    h += '.lnk{display:block;padding:14px;background:linear-gradient(135deg,#00d68f,#00b377);color:#fff;font-size:15px;font-weight:700;border-radius:10px;text-decoration:none;margin:12px 0}'
+    h += '.ip{font-size:22px;font-weight:700;color:#00d68f;margin:8px 0;font-family:monospace}'
+    h += '.wait{padding:12px;background:rgba(255,255,255,.04);border-radius:8px;margin:16px 0}.wait .num{font-size:24px;font-weight:700;color:#ffb740}'
+    h += '.dim{font-size:11px;color:#666;line-height:1.8}'
+    h += '.spinner{display:inline-block;width:14px;height:14px;border:2px solid rgba(255,255,255,.1);border-top:2px solid #00d68f;border-radius:50%;animation:spin 1s linear infinite}@keyframes spin{to{transform:rotate(360deg)}}'
+    h += '</style></head><body><div class="c"><div class="ic">&#127869;</div><h1>Dish Dash</h1><div class="sub">WLAN EINRICHTEN</div><div id="f">'
+    h += '<label>&#128246; Netzwerk waehlen</label><div id="nl" class="nl">'
+    h += nl
+    h += '</div><div class="or">oder manuell eingeben</div>'
+    h += '<input id="ms" placeholder="SSID manuell eingeben" style="font-size:12px">'
+    h += '<label>&#128274; Passwort</label>'
+    h += '<div style="position:relative"><input id="pw" type="password" placeholder="WLAN Passwort"><span id="eye" style="position:absolute;right:10px;top:50%;transform:translateY(-50%);cursor:pointer">&#128065;</span></div>'
+    h += '<button class="btn" id="goBtn">Verbinden</button></div><div id="st" class="st"></div></div>'
+    h += '<script>'
+    h += 'var pick="";'
+    h += 'document.getElementById("nl").addEventListener("click",function(e){var n=e.target.closest(".n");if(!n)return;pick=n.getAttribute("data-s");document.getElementById("ms").value="";var a=document.querySelectorAll(".n");for(var i=0;i<a.length;i++)a[i].className="n";n.className="n a";});'
+    h += 'document.getElementById("eye").addEventListener("click",function(){var i=document.getElementById("pw");i.type=i.type==="password"?"text":"password";});'
+    h += 'document.getElementById("goBtn").addEventListener("click",function(){'
+    h += 'var ssid=pick||document.getElementById("ms").value.trim();'
+    h += 'if(!ssid){document.getElementById("st").innerHTML="<span class=e>Bitte Netzwerk waehlen</span>";return;}'
+    h += 'document.getElementById("st").innerHTML="<div class=spinner></div> Verbinde... (ca. 15 Sek.)";'
+    h += 'document.getElementById("f").style.opacity="0.3";document.getElementById("f").style.pointerEvents="none";'
+    h += 'var x=new XMLHttpRequest();x.timeout=25000;x.open("POST","/api/setup");x.setRequestHeader("Content-Type","application/json");'
+    h += 'x.onload=function(){try{var d=JSON.parse(x.responseText)}catch(e){showDone(ssid,"");return}showDone(ssid,d.ip||"")};'
+    h += 'x.onerror=function(){showDone(ssid,"")};x.ontimeout=function(){showDone(ssid,"")};'
+    h += 'x.send(JSON.stringify({ssid:ssid,password:document.getElementById("pw").value}));});'
+    h += 'function showDone(ssid,ip){document.getElementById("f").style.display="none";'
+    h += 'var h="<div class=ok><div style=font-size:28px;margin-bottom:8px>&#9989;</div>";'
+    h += 'if(ip){h+="<div style=font-weight:600>Verbunden!</div>";h+="<div class=ip>"+ip+"</div>";'
+    h += 'h+="<div class=wait><div style=font-size:12px;color:#888;margin-bottom:6px>Verbinde dein Handy jetzt mit <b style=color:#fff>"+ssid+"</b></div>";'
+    h += 'h+="<div class=num id=ct>10</div><div style=font-size:11px;color:#555>Sekunden</div></div>";'
+    h += 'h+="<div id=lw style=display:none><a class=lnk href=http://"+ip+">&#127869; Dashboard oeffnen</a>";'
+    h += 'h+="<div class=dim>Speichere http://"+ip+" als Lesezeichen!</div></div>";'
+    h += 'var sec=10;var ci=setInterval(function(){sec--;document.getElementById(\"ct\").textContent=sec;if(sec<=0){clearInterval(ci);document.querySelector(\".wait\").style.display=\"none\";document.getElementById(\"lw\").style.display=\"block\";}},1000);'
+    h += '}else{h+="<div style=font-weight:600>Gespeichert!</div>";'
+    h += 'h+="<div style=margin:10px_0;font-size:13px;color:#888>Geraet startet neu...<br>Verbinde dein Handy mit <b style=color:#fff>"+ssid+"</b></div>";'
+    h += 'h+="<div class=wait><div class=num id=ct>15</div><div style=font-size:11px;color:#555>Sekunden</div></div>";'
+    h += 'h+="<div id=lw style=display:none><a class=lnk href=http://' + a.MDNS_HOST + '.local>&#127869; ' + a.MDNS_HOST + '.local</a>";'
+    h += 'h+="<div class=dim>Falls nicht erreichbar: IP im Router nachschauen</div></div>";'
+    h += 'var sec=15;var ci=setInterval(function(){sec--;document.getElementById(\"ct\").textContent=sec;if(sec<=0){clearInterval(ci);document.querySelector(\".wait\").style.display=\"none\";document.getElementById(\"lw\").style.display=\"block\";}},1000);'
+    h += '}h+="</div>";document.getElementById("st").innerHTML=h;}'
+    h += '</script></body></html>'
+    return h
+
+def setup(a, body):
+    data = json.loads(body)
+    ssid = data["ssid"]
+    pwd = data.get("password", "")
+    a.save_wifi(ssid, pwd)
+    ip = a.quick_connect(ssid, pwd)
+    def _rb(t):
+        a.reboot("wifi_setup")
+    machine.Timer(0).init(period=3000 if ip else 1500, mode=machine.Timer.ONE_SHOT, callback=_rb)
+    return '{"ok":true,"ip":"' + (ip or "") + '"}'
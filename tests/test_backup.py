@@ -0,0 +1,105 @@
+# Host-side tests of the line-by-line restore (POST /api/restore): entries
+# applied as they arrive, templates staged on flash, and a refused upload
+# leaving state and sensor as they were.
+import binascii
+import json
+import sys
+
+import pytest
+
+from test_gfx_queue import load_app
+
+sys.modules.setdefault("ubinascii", binascii)
+
+
+class _Client:
+    def __init__(self, data):
+        self.data = data
+
+    def recv(self, n):
+        b = self.data[:n]
+        self.data = self.data[n:]
+        return b
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = load_app()
+    app.cold = lambda name: __import__(name)
+    app.stored = []
+    import fpio
+    monkeypatch.setattr(fpio, "store", lambda a, slot, tpl: app.stored.append((slot, bytes(tpl))))
+    app.state["slots"] = [0, 1]
+    app.fp_sync()
+    app.save_state()
+    app.flush_state()
+    return app
+
+
+def restore(app, *lines):
+    import backup
+    body = "\n".join(x if isinstance(x, str) else json.dumps(x) for x in lines).encode()
+    # Part of the body came with the headers
+    return json.loads(backup.restore(app, _Client(body[40:]), body[:40], len(body)))
+
+
+def tpl(slot, player, data=b"\x01\x02"):
+    return {"fingerprint": {"slot": slot, "player": player, "data": binascii.hexlify(data).decode()}}
+
+
+def test_entry_lines_and_templates(app):
+    # Each entry fits in a line, the section would not
+    big = dict(("%d" % i, "BELOHNUNG %03d " % i + "x" * 50) for i in range(80))
+    r = restore(app, {"names": ["anna", "ben", "carl"]},
+                *[dict(rewards=[big], at=i) for i in range(3)] +
+                [{"texts": {"point": "JA"}}, {"texts": {"reset": "NEU"}},
+                 {"scores": [5, 6, 7]}, {"game": {"vacation": [0, 1, 0], "ended": True}},
+                 {"display": {"brightness": 40}}, {"turn": 2},
+                 tpl(4, 2, b"\xaa" * 512), tpl(7, 0)])
+    assert r == {"ok": True, "fingers": 2, "failed": 0}
+    import backup
+    assert len(json.dumps(big)) < backup.LINE_MAX < len(json.dumps(big)) * 3
+    s = app.state
+    assert s["names"] == ["ANNA", "BEN", "CARL"]
+    assert s["rewards"] == [big] * 3
+    assert s["texts"]["point"] == "JA" and s["texts"]["reset"] == "NEU"
+    assert s["scores"] == [5, 6, 7] and len(s["avatars"]) == 3
+    assert s["game"]["vacation"] == [False, True, False] and s["game"]["ended"]
+    assert s["display"]["brightness"] == 15
+    assert s["turn"] == 2
+    assert app.stored == [(4, b"\xaa" * 512), (7, b"\x01\x02")]
+    assert s["slots"] == [0, 1, -1, -1, 2, -1, -1, 0]
+
+
+def test_one_line_sections_still_work(app):
+    r = restore(app, {"names": ["a", "b"], "scores": [1, 2]}, {"rewards": [{}, {"5": "EIS"}]})
+    assert r["ok"] and app.state["rewards"] == [{}, {"5": "EIS"}]
+
+
+@pytest.mark.parametrize("lines, error", [
+    (["{bad"], "Ungültige Zeile"),
+    (["[1]"], "Ungültige Zeile"),
+    (["x" * 9000], "Zeile zu lang"),
+    ([{"names": ["a", "b"]}, {"scores": [1]}], "scores"),
+    ([{"scores": ["1", 2, 3, 4]}], "scores"),
+    ([{"rewards": [{}], "at": 1}], "rewards"),
+    ([{"rewards": [{}, {}]}, {"rewards": [{}], "at": 3}], "rewards"),
+    ([{"names": []}], "names"),
+    ([{"avatars": [1, 2, 3, 4]}], "avatars"),
+    ([{"slots": [0, 9]}], "slots"),
+    ([{"turn": 4}], "turn"),
+    ([{"running": "ja"}], "running"),
+    ([{"display": {"brightness": "hell"}}], "display"),
+    ([{"game": {"vacation": [True]}}], "game"),
+    ([tpl(3, 9)], "Ungültiger Fingerabdruck"),
+    ([{"fingerprint": {"slot": 3, "player": 0, "data": "zz"}}], "Ungültiger Fingerabdruck"),
+    ([{"names": ["a", "b"]}, {"scores": [1, 2]}, tpl(3, 2)], "Ungültiger Fingerabdruck"),
+])
+def test_refused_upload_changes_nothing(app, lines, error):
+    before = repr(app.state)
+    # Entries before the bad line are applied first, then rolled back
+    r = restore(app, {"scores": [9, 9, 9, 9]}, {"texts": {"point": "WEG"}}, tpl(5, 0), *lines)
+    assert r == {"ok": False, "error": error}
+    assert repr(app.state) == before
+    assert app.stored == []
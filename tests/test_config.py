@@ -0,0 +1,79 @@
+# Host-side tests of settings updates (PATCH /api/config): conversion,
+# clamping, rejection and all-or-nothing application.
+import pytest
+
+from test_gfx_queue import load_app
+
+
+def fresh():
+    app = load_app()
+    app.save_state = lambda: None
+    app.show_current_state = lambda: None
+    return app
+
+
+def test_values_are_converted_and_clamped():
+    app = fresh()
+    out = app._cfg_norm({
+        "display": {"brightness": 99, "scrollSpeed": "40", "motionTimeout": "30", "pirEnabled": 0},
+        "sound": {"volume": 0, "enabled": True},
+        "game": {"jumpInScore": "12", "vacation": [1, 0], "endDate": "2026-12-24"},
+        "names": {"names": ["anna", "ben"], "avatars": ["a"]},
+        "rewards": {"player": 1, "rewards": {"10": "EIS"}},
+        "device": {"dualCore": 1},
+    })
+    assert out["display"] == {"brightness": 15, "scrollSpeed": 40, "motionTimeout": 30, "pirEnabled": False}
+    assert out["sound"] == {"volume": 1, "enabled": True}
+    assert out["game"] == {"jumpInScore": 10, "vacation": [True, False], "endDate": "2026-12-24"}
+    assert out["names"]["names"] == ["ANNA", "BEN"]
+    assert out["rewards"] == {1: {"10": "EIS"}}
+    assert out["device"] == {"dualCore": True}
+
+
+def test_unknown_keys_are_dropped():
+    # The dashboard posts whole state objects back
+    app = fresh()
+    out = app._cfg_norm({"display": {"brightness": 3, "later": [1]}, "sound": {"x": None},
+                         "game": {"ended": True, "endDate": ""}})
+    assert out == {"display": {"brightness": 3}, "sound": {}, "game": {"endDate": ""}}
+
+
+@pytest.mark.parametrize("cfg, section", [
+    ([], "config"),
+    ({"foo": {}}, "foo"),
+    ({"display": []}, "display"),
+    ({"display": {"brightness": None}}, "display"),
+    ({"display": {"scrollSpeed": "fast"}}, "display"),
+    ({"display": {"pirEnabled": "no"}}, "display"),
+    ({"sound": {"volume": [3]}}, "sound"),
+    ({"texts": {"point": 3}}, "texts"),
+    ({"texts": "HALLO"}, "texts"),
+    ({"names": {"names": []}}, "names"),
+    ({"names": {"names": ["A"] * 9}}, "names"),
+    ({"names": {"names": ["A", None]}}, "names"),
+    ({"names": {"avatars": "x"}}, "names"),
+    ({"rewards": {"player": "1"}}, "rewards"),
+    ({"rewards": {"player": True}}, "rewards"),
+    ({"rewards": {"player": 9}}, "rewards"),
+    ({"rewards": [{}] * 9}, "rewards"),
+    ({"rewards": {"player": 0, "rewards": {"10": 5}}}, "rewards"),
+    ({"game": {"vacation": "yes"}}, "game"),
+    ({"game": {"endDate": 20261224}}, "game"),
+    ({"device": {"dualCore": "on"}}, "device"),
+])
+def test_bad_sections_are_named(cfg, section):
+    app = fresh()
+    with pytest.raises(ValueError) as e:
+        app._cfg_norm(cfg)
+    assert str(e.value) == section
+
+
+def test_update_is_all_or_nothing():
+    app = fresh()
+    before = repr(app.state)
+    assert app.config_update({"display": {"brightness": 1}, "sound": {"volume": "x"}}) == "sound"
+    assert repr(app.state) == before
+    assert app.config_update({"display": {"brightness": 1, "motionTimeout": "45"}, "device": {"fpHighSpeed": True}}) is None
+    assert app.state["display"]["brightness"] == 1
+    assert app.state["motionTimeout"] == 45
+    assert app.state["device"]["fpHighSpeed"]
@@ -0,0 +1,58 @@
+# Host-side tests of the event batch check (POST /api/events) on ports
+# counting from 1970 and from 2000, with the clock set and unset.
+import time
+
+import pytest
+
+from test_gfx_queue import load_app
+
+Y2000 = 946684800
+NOW_UNIX = 1792368000  # 2026-10-19
+
+
+def app_with_clock(monkeypatch, epoch, now):
+    """An app on a port whose epoch starts at Unix time epoch, clock at now"""
+    gmtime = time.gmtime
+    monkeypatch.setattr(time, "gmtime", lambda t=None: gmtime(epoch if t == 0 else t))
+    monkeypatch.setattr(time, "time", lambda: now)
+    app = load_app()
+    app.state["names"] = ["A", "B"]
+    return app
+
+
+def ok(app, t):
+    try:
+        app._events_check([{"a": "score", "player": 0, "t": t}])
+    except ValueError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("epoch", [0, Y2000])
+def test_clock_set(monkeypatch, epoch):
+    now = NOW_UNIX - epoch
+    app = app_with_clock(monkeypatch, epoch, now)
+    assert app.EV_T_MIN == 1577836800 - epoch
+    assert ok(app, now) and ok(app, now - 30 * 86400)
+    assert ok(app, now + app.EV_AHEAD)
+    assert not ok(app, now + app.EV_AHEAD + 1)
+    assert not ok(app, app.EV_T_MIN - 1)
+    # What do_score stamps by default passes too
+    assert ok(app, int(time.time()))
+
+
+@pytest.mark.parametrize("epoch", [0, Y2000])
+def test_clock_unset(monkeypatch, epoch):
+    app = app_with_clock(monkeypatch, epoch, 600)
+    assert ok(app, int(time.time()))
+    assert ok(app, NOW_UNIX - epoch)
+    assert not ok(app, -1) and not ok(app, 0x100000000)
+
+
+def test_batch_is_checked_whole(monkeypatch):
+    app = app_with_clock(monkeypatch, 0, NOW_UNIX)
+    for bad in ({"a": "score"}, [{"a": "score", "player": 2}], [{"a": "score", "player": True}],
+                [{"a": "start"}, "score"], [{"a": "skip", "t": "1"}], [{"a": "skip", "t": 1.5}]):
+        with pytest.raises(ValueError):
+            app._events_check(bad)
+    app._events_check([{"a": "start"}, {"a": "score", "player": 1}, {"a": "skip", "t": NOW_UNIX}])
@@ -0,0 +1,131 @@
+# Host-side test of the display/sound command queue (dual-core mode).
+# Runs under CPython (python -m pytest tests, or python tests/test_gfx_queue.py)
+# and the MicroPython unix port (micropython tests/test_gfx_queue.py).
+# machine and network are replaced by stubs; app.py is executed up to its
+# MAIN section, so nothing touches hardware or starts the server.
+import sys
+import time
+
+ROOT = (__file__.rsplit("/", 1)[0] if "/" in __file__ else ".") + "/.."
+
+
+class _Fake:
+    def __init__(self, *a, **k):
+        pass
+
+    def __call__(self, *a, **k):
+        return _Fake()
+
+    def __getattr__(self, name):
+        return _Fake()
+
+
+class _Spi:
+    """Records which thread writes to the bus"""
+    def __init__(self):
+        self.writers = []
+
+    def write(self, d):
+        self.writers.append(_thread.get_ident())
+
+
+import _thread
+
+if not hasattr(time, "ticks_ms"):
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_add = lambda a, b: a + b
+    time.ticks_diff = lambda a, b: a - b
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+
+_stack_size = _thread.stack_size
+
+
+def _stack_size_any(n=0):
+    # CPython needs at least 32 KiB; the ESP32 size only matters there
+    try:
+        return _stack_size(n)
+    except ValueError:
+        return _stack_size(0)
+
+
+_thread.stack_size = _stack_size_any
+
+
+def load_app():
+    """A fresh app module with stubbed hardware, up to # === MAIN ==="""
+    for m in ("machine", "network"):
+        sys.modules[m] = _Fake()
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    with open(ROOT + "/app.py") as f:
+        src = f.read()
+    src = src[:src.index("# === MAIN ===")]
+    app = type(sys)("app")
+    sys.modules["app"] = app
+    exec(src, app.__dict__)
+    app.spi = _Spi()
+    return app
+
+
+def wait_idle(app, ms=2000):
+    end = time.ticks_add(time.ticks_ms(), ms)
+    while not app.gfx_idle():
+        assert time.ticks_diff(end, time.ticks_ms()) > 0, "queue not drained"
+        time.sleep_ms(5)
+
+
+def test_inline_without_thread():
+    app = load_app()
+    app.scroll_start("HALLO", count=1, speed=20)
+    assert app.scroll["text"] == "HALLO"
+    assert not app.scroll["done"]
+    assert app.gfx_idle()
+
+
+def test_queue_keeps_init_and_latest_text():
+    app = load_app()
+    # Queue only: no consumer yet
+    app._gfx_lock = _thread.allocate_lock()
+    app.gfx_on = True
+    app.led_init()
+    for i in range(40):
+        app.scroll_speed(10 + i)
+        app.scroll_start("T" + str(i))
+    app.scroll_static("SETUP")
+    fns = [c[0] for c in app._gfx_q]
+    assert fns[0] is app._led_init
+    assert len(app._gfx_q) <= app.GFX_Q_MAX + 1
+    texts = [c for c in app._gfx_q if c[0] in (app._scroll_start, app._scroll_static)]
+    assert len(texts) == 1 and texts[0][1] == ("SETUP",)
+    # The caller's view of the scroll is untouched until the thread runs it
+    assert not app.scroll["static"]
+    assert not app.gfx_idle()
+
+
+def test_thread_owns_the_bus():
+    app = load_app()
+    assert app.gfx_start()
+    app.led_init()
+    for i in range(50):
+        app.scroll_start("TEXT " + str(i), count=1, speed=1)
+        if i % 7 == 0:
+            app.led_brightness(i % 15)
+    wait_idle(app)
+    time.sleep_ms(50)
+    main = _thread.get_ident()
+    assert app.spi.writers, "nothing was drawn"
+    assert main not in app.spi.writers
+    assert app.scroll["text"] == "TEXT 49"
+    app.scroll_static("SETUP")
+    wait_idle(app)
+    assert app.scroll["static"] and app.scroll["done"]
+    # Inline scroll ticks are no-ops in thread mode
+    n = len(app.spi.writers)
+    app.scroll_tick()
+    assert main not in app.spi.writers[n:]
+
+
+if __name__ == "__main__":
+    for name in ("test_inline_without_thread", "test_queue_keeps_init_and_latest_text", "test_thread_owns_the_bus"):
+        globals()[name]()
+        print("ok", name)
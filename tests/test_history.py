@@ -0,0 +1,147 @@
+# Host-side tests of history.bin: write-behind with the state save, the
+# ring and the player remap.
+import json
+import os
+import struct
+
+from test_gfx_queue import load_app
+
+
+def fresh(tmp_path, monkeypatch, names=("A", "B", "C")):
+    monkeypatch.chdir(tmp_path)
+    app = load_app()
+    app.state["names"] = list(names)
+    n = len(names)
+    for k, dv in (("scores", 0), ("streaks", 0), ("fp", False), ("avatars", "x"), ("rewards", {})):
+        app.state[k] = [dv] * n
+    app.state["game"]["vacation"] = [False] * n
+    app.stats_resize(n)
+    return app
+
+
+def records(app):
+    """(time, player, points) of every record, oldest first"""
+    out = []
+    with open(app.HIST_FN, "rb") as f:
+        head, count = app._hist_header(f)
+        start = head if count == app.HIST_CAP else 0
+        for i in range(count):
+            f.seek(app._HHDR_SZ + ((start + i) % app.HIST_CAP) * app._HREC_SZ)
+            out.append(struct.unpack(app._HREC_FMT, f.read(app._HREC_SZ)))
+    return out
+
+
+def test_score_waits_for_the_state_save(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    t = app.EV_T_MIN
+    app.do_events([{"a": "score", "player": 0, "t": t}, {"a": "score", "player": 2, "t": t + 1}])
+    app.do_reset()
+    assert not os.path.exists(app.HIST_FN)
+    assert len(app._hist_pending) == 3
+    app.flush_state()
+    recs = records(app)
+    assert recs[:2] == [(t, 0, 1), (t + 1, 2, 1 | app.HIST_JUMP)]
+    assert recs[2][1:] == (app.HIST_RESET, 0)
+    assert not app._hist_pending
+
+
+def test_discard_drops_queued_records(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app.do_events([{"a": "score", "player": 0}])
+    app.save_discard()
+    app.flush_state()
+    assert not os.path.exists(app.HIST_FN)
+
+
+class _Client:
+    def __init__(self):
+        self.data = b""
+
+    def send(self, b):
+        self.data += b.encode() if isinstance(b, str) else bytes(b)
+
+    def body(self):
+        return self.data.split(b"\r\n\r\n", 1)[1].decode()
+
+
+def add(app, recs):
+    for t, p, pts in recs:
+        app.history_add(p, t, pts)
+    app.history_flush()
+
+
+def query(app, q):
+    cl = _Client()
+    app.send_history(cl, "/api/history?" + q)
+    return json.loads(cl.body())
+
+
+def test_ring_keeps_the_newest(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app.HIST_CAP = 8
+    add(app, [(100 + i, i % 3, 1) for i in range(5)])
+    add(app, [(105 + i, i % 3, 1) for i in range(6)])
+    assert [r[0] for r in records(app)] == list(range(103, 111))
+    with open(app.HIST_FN, "rb") as f:
+        assert app._hist_header(f) == (3, 8)
+
+
+def test_corrupt_header_starts_over(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    with open(app.HIST_FN, "wb") as f:
+        f.write(b"XX\x01\x00\xff\xff")
+    add(app, [(100, 1, 1)])
+    assert records(app) == [(100, 1, 1)]
+
+
+def test_query_filters_and_pages(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app.HIST_CAP = 8
+    add(app, [(100 + i, i % 2, 1) for i in range(11)])
+    # Ring holds 103..110, oldest first
+    r = query(app, "player=1&limit=2")
+    assert r == {"records": [[103, 1, 1, 0], [105, 1, 1, 0]], "offset": 0, "next": 2}
+    r = query(app, "player=1&limit=2&offset=2")
+    assert r["records"] == [[107, 1, 1, 0], [109, 1, 1, 0]] and r["next"] is None
+    r = query(app, "from=108&to=109")
+    assert [x[0] for x in r["records"]] == [108, 109]
+    app.history_add(0, 200, 2, True)
+    assert query(app, "from=200")["records"] == [[200, 0, 2, 1]]
+
+
+def test_bad_query(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    cl = _Client()
+    app.send_history(cl, "/api/history?from=gestern")
+    assert json.loads(cl.body()) == {"error": "bad query"}
+
+
+def test_remap_across_the_wrap(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app.HIST_CAP = 8
+    add(app, [(100 + i, i % 3, 1) for i in range(10)])
+    app.history_add(app.HIST_RESET, 110, 0)
+    # Player 1 leaves, 2 moves up
+    app.history_remap([0, -1, 1])
+    # The ring held 103..110
+    assert records(app) == [(103, 0, 1), (105, 1, 1), (106, 0, 1), (108, 1, 1),
+                            (109, 0, 1), (110, app.HIST_RESET, 0)]
+    with open(app.HIST_FN, "rb") as f:
+        assert app._hist_header(f) == (6, 6)
+    # The ring keeps working after the rewrite
+    add(app, [(111 + i, 0, 1) for i in range(3)])
+    assert [r[0] for r in records(app)] == [105, 106, 108, 109, 110, 111, 112, 113]
+
+
+def test_remove_player(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app.fp_delete = lambda slot: None
+    app.state["slots"] = [0, 1, 2, 1]
+    app.state["turn"] = 1
+    add(app, [(100, 0, 1), (101, 1, 1), (102, 2, 1)])
+    app.players_reorder([0, 2])
+    assert app.state["names"] == ["A", "C"]
+    assert app.state["slots"] == [0, -1, 1]
+    assert app.state["fp"] == [True, True]
+    assert app.state["turn"] == 1
+    assert records(app) == [(100, 0, 1), (102, 1, 1)]
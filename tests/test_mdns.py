@@ -0,0 +1,76 @@
+# Host-side tests of the mDNS responder reading datagrams into its buffer,
+# with and without recvfrom_into.
+import struct
+
+from test_gfx_queue import load_app
+
+
+class _Sock:
+    def __init__(self, packets):
+        self.packets = list(packets)
+        self.out = []
+
+    def sendto(self, b, addr):
+        self.out.append((bytes(b), addr))
+
+    def _next(self, buf):
+        if not self.packets:
+            raise OSError(11)  # EAGAIN, non-blocking
+        d, addr = self.packets.pop(0)
+        buf[:len(d)] = d
+        return len(d), addr
+
+
+class _SockFrom(_Sock):
+    def recvfrom_into(self, buf):
+        return self._next(buf)
+
+
+class _SockRead(_Sock):
+    def readinto(self, buf):
+        if not self.packets:
+            return None
+        return self._next(buf)[0]
+
+
+def query(app, name, qid=0):
+    return struct.pack(">HHHHHH", qid, 0, 1, 0, 0, 0) + app._dns_name(name) + b"\x00\x01\x00\x01"
+
+
+def ready_app(sock):
+    app = load_app()
+    app._mdns_build("10.0.0.5")
+    app.mdns_sock = sock
+    app._mdns_from = hasattr(sock, "recvfrom_into")
+    app._mdns_phase = 5
+    return app
+
+
+def test_answers_from_the_buffer():
+    app = load_app()
+    q = query(app, app.MDNS_HOST + ".local")
+    sock = _SockFrom([(b"\x00" * 5, ("10.0.0.9", 5353)), (q, ("10.0.0.9", 5353))])
+    app = ready_app(sock)
+    app.check_mdns("10.0.0.5")
+    assert sock.out == [(app._mdns_resps[app._R_A], app.MDNS_GROUP)]
+
+
+def test_legacy_querier_gets_a_unicast_reply():
+    app = load_app()
+    q = query(app, app.MDNS_HOST + ".local", 0x1234)
+    sock = _SockFrom([(q, ("10.0.0.9", 40000))])
+    app = ready_app(sock)
+    app.check_mdns("10.0.0.5")
+    (r, addr), = sock.out
+    assert addr == ("10.0.0.9", 40000)
+    assert struct.unpack(">HHHHHH", r[:12])[:3] == (0x1234, 0x8400, 1)
+    assert r[12:len(q)] == q[12:]
+
+
+def test_readinto_without_sender():
+    app = load_app()
+    q = query(app, app.MDNS_HOST + ".local", 0x1234)
+    sock = _SockRead([(q, None)])
+    app = ready_app(sock)
+    app.check_mdns("10.0.0.5")
+    assert sock.out == [(app._mdns_resps[app._R_A], app.MDNS_GROUP)]
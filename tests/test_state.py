@@ -0,0 +1,128 @@
+# Host-side tests of the binary state snapshot (state.bin): round trip,
+# truncated files and the upgrade of older snapshot versions.
+import struct
+
+from test_gfx_queue import load_app
+
+
+def fresh(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = load_app()
+    app.state["names"] = ["ANNA", "BEN", "CARL"]
+    app.state["avatars"] = ["a", "b", "c"]
+    app.state["scores"] = [12, 0, 70000]
+    app.state["streaks"] = [3, 0, 1]
+    app.state["fp"] = [True, False, True]
+    app.state["slots"] = [0, -1, 2, 2]
+    app.state["rewards"] = [{"10": "EIS"}, {}, {"5": "KINO"}]
+    app.state["game"]["vacation"] = [False, True, False]
+    app.state["game"]["endDate"] = "2026-12-24"
+    app.state["turn"] = 2
+    app.state["lastScorer"] = 1
+    app.state["texts"]["point"] = "{NAME} PUNKT"
+    app.state["display"]["brightness"] = 9
+    app.state["motionTimeout"] = 300
+    app.state["device"]["fpHighSpeed"] = True
+    app.state["device"]["dualCore"] = True
+    app.stats_resize(3)
+    app.stats["wk"] = 20000
+    app.stats["mo"] = 660
+    app.stats["pl"][1]["best"] = 7
+    app.stats["pl"][1]["last"] = 1234567
+    return app
+
+
+def reload(app, fn="state.bin"):
+    """A second app that reads fn, as after a reboot"""
+    other = load_app()
+    return other, other._read_state(fn)
+
+
+def test_round_trip(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app._write_state("state.bin")
+    other, ver = reload(app)
+    assert ver == app.STATE_VERSION
+    for k in ("names", "avatars", "scores", "streaks", "fp", "slots", "rewards", "turn",
+              "lastScorer", "game", "motionTimeout", "device"):
+        assert other.state[k] == app.state[k], k
+    assert other.state["texts"]["point"] == "{NAME} PUNKT"
+    assert other.state["display"]["brightness"] == 9
+    assert other.stats["wk"] == 20000 and other.stats["mo"] == 660
+    assert other.stats["pl"][1]["best"] == 7 and other.stats["pl"][1]["last"] == 1234567
+
+
+def test_bad_values_are_clamped(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app.state["display"]["brightness"] = 999
+    app.state["scores"] = [-5, 1]
+    app._write_state("state.bin")
+    other, _ = reload(app)
+    assert other.state["display"]["brightness"] == 255
+    assert other.state["scores"] == [0, 1, 0]
+
+
+def test_truncated_file_leaves_globals(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app._write_state("state.bin")
+    with open("state.bin", "rb") as f:
+        data = f.read()
+    for cut in (len(data) - 2, len(data) - 30, 40):
+        with open("cut.bin", "wb") as f:
+            f.write(data[:cut])
+        other = load_app()
+        before = (repr(other.state), repr(other.stats))
+        try:
+            other._read_state("cut.bin")
+        except Exception:
+            pass
+        else:
+            raise AssertionError("read a file cut at " + str(cut))
+        assert (repr(other.state), repr(other.stats)) == before, cut
+
+
+def _downgrade(app, data, ver):
+    """The same snapshot as version ver wrote it"""
+    n = len(app.state["names"])
+    data = data[:-1]
+    if ver < 3:
+        data = data[:-(1 + len(app.state["slots"]))]
+    if ver < 2:
+        data = data[:-(6 + n * struct.calcsize(app._ST_FMT))]
+    return data[:2] + bytes([ver]) + data[3:]
+
+
+def test_migrate_v3_v2_v1(tmp_path, monkeypatch):
+    app = fresh(tmp_path, monkeypatch)
+    app._write_state("state.bin")
+    with open("state.bin", "rb") as f:
+        data = f.read()
+    for ver in (3, 2, 1):
+        with open("state.bin", "wb") as f:
+            f.write(_downgrade(app, data, ver))
+        other = load_app()
+        other.load_state()
+        assert other.state["device"] == {"fpHighSpeed": False, "dualCore": False}
+        if ver == 3:
+            assert other.state["slots"] == app.state["slots"]
+        else:
+            # Slots come back from the fp flags, slot == player
+            assert other.state["slots"] == [0, -1, 2]
+        assert other.state["scores"] == app.state["scores"]
+        assert len(other.stats["pl"]) == 3
+        if ver == 2:
+            assert other.stats["pl"][1]["best"] == 7
+        # The upgrade is written back as the current version
+        other.flush_state()
+        with open("state.bin", "rb") as f:
+            assert f.read(3)[2] == app.STATE_VERSION
+
+
+def test_switches_move_from_network_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("network.json", "w") as f:
+        f.write('{"dhcp": true, "fpHighSpeed": true, "dualCore": true}')
+    app = load_app()
+    app.load_network()
+    assert app.state["device"] == {"fpHighSpeed": True, "dualCore": True}
+    assert app.network_config == {"dhcp": True, "ip": "", "gateway": "", "dns": ""}